@@ -0,0 +1,869 @@
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+
+def load_game():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "space-explorer.py")
+    spec = importlib.util.spec_from_file_location("space_explorer", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+se = load_game()
+
+def offscreen():
+    return pygame.Surface((se.SCREEN_WIDTH, se.SCREEN_HEIGHT))
+
+def spawn_on_screen(count):
+    asteroids = []
+    for _ in range(count):
+        asteroid = se.Asteroid()
+        asteroid.rect.y = random.randint(0, se.SCREEN_HEIGHT - asteroid.size)
+        asteroids.append(asteroid)
+    return asteroids
+
+def uncached_asteroid_draw(asteroid, surface):
+    rotated_image = pygame.transform.rotate(asteroid.image, asteroid.rotation)
+    rotated_rect = rotated_image.get_rect(center=asteroid.rect.center)
+    surface.blit(rotated_image, rotated_rect)
+
+def time_asteroid_draw(asteroids, draw, frames):
+    surface = offscreen()
+    elapsed = 0.0
+    for _ in range(frames):
+        for asteroid in asteroids:
+            asteroid.update()
+            if asteroid.rect.top > se.SCREEN_HEIGHT:
+                asteroid.rect.y = -asteroid.size
+        surface.fill(se.BACKGROUND_COLOR)
+        start = time.perf_counter()
+        for asteroid in asteroids:
+            draw(asteroid, surface)
+        elapsed += time.perf_counter() - start
+    return elapsed / (frames * len(asteroids))
+
+def bench_rotation(args):
+    print(f"asteroid draw, {args.frames} frames, {se.ROTATION_STEPS} rotation steps")
+    for count in (50, 200, 1000):
+        random.seed(count)
+        asteroids = spawn_on_screen(count)
+        before = time_asteroid_draw(asteroids, uncached_asteroid_draw, args.frames)
+        
+        random.seed(count)
+        asteroids = spawn_on_screen(count)
+        se.rotation_cache.clear()
+        after = time_asteroid_draw(asteroids, se.Asteroid.draw, args.frames)
+        
+        cache = se.rotation_cache
+        print(f"{count:5d} asteroids  before {before * 1e6:7.2f} us/asteroid  "
+              f"after {after * 1e6:7.2f} us/asteroid  ({before / after:.1f}x, "
+              f"{cache.hits / max(cache.hits + cache.misses, 1):.0%} hits, "
+              f"{cache.bytes / 1024 / 1024:.1f} MiB cached)")
+
+class SurfaceCounter:
+    def __init__(self):
+        self.count = 0
+        self.original = pygame.Surface
+        
+    def __enter__(self):
+        counter = self
+        
+        class CountingSurface(self.original):
+            def __init__(self, *args, **kwargs):
+                counter.count += 1
+                super().__init__(*args, **kwargs)
+                
+        pygame.Surface = CountingSurface
+        return self
+        
+    def __exit__(self, *exc):
+        pygame.Surface = self.original
+
+def effect_scene():
+    entities = []
+    for i in range(20):
+        x = 20 + i * 38
+        entities.append(se.Missile(x, 100 + i * 7))
+        entities.append(se.PowerMissile(x, 250 + i * 5))
+        entities.append(se.AlienMissile(x, 400 + i * 3))
+    for i in range(5):
+        entities.append(se.Heart(80 + i * 150, 150))
+        power_star = se.PowerStar()
+        power_star.rect.y = 300
+        entities.append(power_star)
+    entities.append(se.AlienBoss())
+    return entities
+
+def bench_effects(args):
+    random.seed(0)
+    surface = offscreen()
+    entities = effect_scene()
+    se.effects.clear()
+    per_frame = []
+    elapsed = 0.0
+    with SurfaceCounter() as counter:
+        for _ in range(args.frames):
+            for entity in entities:
+                entity.update()
+                entity.rect.y %= se.SCREEN_HEIGHT
+            surface.fill(se.BACKGROUND_COLOR)
+            before = counter.count
+            start = time.perf_counter()
+            for entity in entities:
+                entity.draw(surface)
+            elapsed += time.perf_counter() - start
+            per_frame.append(counter.count - before)
+    steady = per_frame[len(per_frame) // 2:]
+    print(f"effect draw, {len(entities)} entities, {args.frames} frames")
+    print(f"Surface constructions: first frame {per_frame[0]}, "
+          f"steady state {sum(steady) / len(steady):.2f}/frame, "
+          f"{len(se.effects.surfaces)} cached effect variants")
+    print(f"draw time {elapsed / args.frames * 1000:.3f} ms/frame")
+
+def legacy_explosion_draw(explosion, surface):
+    current_size = int(explosion.size * (1 - explosion.current_frame / explosion.max_frames))
+    colors = [
+        (255, 200, 0, 255 - (255 * explosion.current_frame // explosion.max_frames)),
+        (255, 100, 0, 200 - (200 * explosion.current_frame // explosion.max_frames)),
+        (255, 0, 0, 150 - (150 * explosion.current_frame // explosion.max_frames))
+    ]
+    for i, color in enumerate(colors):
+        explosion_surf = pygame.Surface((current_size * 2, current_size * 2), pygame.SRCALPHA)
+        pygame.draw.circle(explosion_surf, color, (current_size, current_size),
+                           int(current_size * (0.6 + i * 0.2)))
+        surface.blit(explosion_surf, (explosion.position[0] - current_size,
+                                      explosion.position[1] - current_size))
+
+def time_explosions(count, draw, frames):
+    random.seed(count)
+    surface = offscreen()
+    explosions = []
+    elapsed = 0.0
+    with SurfaceCounter() as counter:
+        for _ in range(frames):
+            while len(explosions) < count:
+                position = (random.randint(0, se.SCREEN_WIDTH), random.randint(0, se.SCREEN_HEIGHT))
+                size = random.choice([20, 30, random.randint(se.ASTEROID_SIZE_MIN, se.ASTEROID_SIZE_MAX), 100])
+                explosions.append(se.Explosion(position, size))
+            explosions = [explosion for explosion in explosions if not explosion.update()]
+            surface.fill(se.BACKGROUND_COLOR)
+            start = time.perf_counter()
+            for explosion in explosions:
+                draw(explosion, surface)
+            elapsed += time.perf_counter() - start
+    return elapsed / frames, counter.count / frames
+
+def time_steps(step, frames):
+    rng = random.Random(0)
+    actions = [rng.randrange(se.ENV_ACTIONS) for _ in range(frames)]
+    start = time.perf_counter()
+    for action in actions:
+        step(action)
+    return (time.perf_counter() - start) / frames
+
+def bench_environment(args):
+    frames = max(args.frames, 1000)
+    print(f"Environment.step throughput, random actions, {frames} steps")
+    game = se.Game(seed=0)
+    game.lives = 10 ** 9
+    update_time = time_steps(lambda action: game.update(se.MASK_KEYS[action]), frames)
+    print(f"{'Game.update only':32s} {update_time * 1e6:8.1f} us/step {1 / update_time:9.0f} steps/s")
+    
+    def copied_frame(env):
+        env.game.draw()
+        return pygame.surfarray.array3d(env.screen).transpose(1, 0, 2).copy()
+        
+    for label, observation, size, stack in (
+        ("state", "state", None, 1),
+        ("state, 4 stacked", "state", None, 4),
+        ("pixels 800x600", "pixels", None, 1),
+        ("pixels 84x84", "pixels", (84, 84), 1),
+        ("pixels 84x84, 4 stacked", "pixels", (84, 84), 4),
+        ("pixels 800x600 via array3d copy", "pixels", None, 1),
+    ):
+        env = se.Environment(observation, size, stack)
+        env.reset(0)
+        env.game.lives = 10 ** 9
+        if label.endswith("copy"):
+            def step(action, env=env):
+                env.game.update(se.MASK_KEYS[action])
+                return copied_frame(env)
+        else:
+            step = env.step
+        step_time = time_steps(step, frames)
+        print(f"{label:32s} {step_time * 1e6:8.1f} us/step {1 / step_time:9.0f} steps/s")
+
+def bench_explosions(args):
+    print(f"explosion draw, {args.frames} frames")
+    for count in (10, 50, 200):
+        before, before_allocs = time_explosions(count, legacy_explosion_draw, args.frames)
+        se.explosion_frames.clear()
+        after, after_allocs = time_explosions(count, se.Explosion.draw, args.frames)
+        print(f"{count:4d} explosions  before {before * 1000:6.3f} ms/frame ({before_allocs:5.1f} surfaces)  "
+              f"after {after * 1000:6.3f} ms/frame ({after_allocs:4.2f} surfaces)  {before / after:.1f}x")
+
+def time_star_field(star_field, frames):
+    surface = offscreen()
+    start = time.perf_counter()
+    for _ in range(frames):
+        star_field.update()
+        star_field.draw(surface)
+    return (time.perf_counter() - start) / frames
+
+def bench_starfield(args):
+    print(f"star field update + draw, {args.frames} frames")
+    for count in (100, 1000, 10000):
+        random.seed(count)
+        before = time_star_field(se.StarField(count), args.frames)
+        if se.np is None:
+            print(f"{count:6d} stars  list {before * 1000:7.3f} ms/frame  (numpy not installed)")
+            continue
+        after = time_star_field(se.ArrayStarField(count), args.frames)
+        print(f"{count:6d} stars  list {before * 1000:7.3f} ms/frame  "
+              f"numpy {after * 1000:7.3f} ms/frame  {before / after:.1f}x")
+
+def time_particles(particles, count, frames):
+    surface = offscreen()
+    rng = random.Random(count)
+    update_time = draw_time = 0.0
+    for _ in range(frames):
+        while len(particles) < count:
+            particles.emit("asteroid", rng.randint(0, se.SCREEN_WIDTH), rng.randint(0, se.SCREEN_HEIGHT))
+        start = time.perf_counter()
+        particles.update()
+        middle = time.perf_counter()
+        particles.draw(surface)
+        update_time += middle - start
+        draw_time += time.perf_counter() - middle
+    return update_time / frames, draw_time / frames
+
+def bench_particles(args):
+    print(f"particle update / draw, {args.frames} frames (ms/frame)")
+    for count in (500, 2000, se.PARTICLE_LIMIT):
+        update, draw = time_particles(se.ParticleList(0), count, args.frames)
+        line = f"{count:5d} particles  list {update * 1000:6.3f} / {draw * 1000:6.3f}"
+        if se.np is not None:
+            array_update, array_draw = time_particles(se.ParticleSystem(0), count, args.frames)
+            line += (f"  numpy {array_update * 1000:6.3f} / {array_draw * 1000:6.3f}  "
+                     f"{(update + draw) / (array_update + array_draw):.1f}x")
+        print(line)
+
+def time_collision_stress(collision, count, frames):
+    random.seed(count)
+    game = se.Game(collision=collision, seed=count)
+    game.lives = 10 ** 9
+    elapsed = 0.0
+    for _ in range(frames):
+        while len(game.asteroids) < count:
+            asteroid = se.spawn(se.Asteroid)
+            asteroid.rect.y = random.randint(0, se.SCREEN_HEIGHT - asteroid.size)
+            game.asteroids.append(asteroid)
+        while len(game.missiles) < count:
+            game.missiles.append(se.spawn(se.Missile, random.randint(0, se.SCREEN_WIDTH - se.MISSILE_SIZE),
+                                          random.randint(0, se.SCREEN_HEIGHT)))
+        start = time.perf_counter()
+        game.update(se.NO_KEYS)
+        elapsed += time.perf_counter() - start
+    return elapsed / frames
+
+def scripted_inputs(frames):
+    for frame in range(frames):
+        direction = pygame.K_LEFT if (frame // 90) % 2 else pygame.K_RIGHT
+        yield se.KeyState((direction, pygame.K_SPACE))
+
+def game_summary(game):
+    return (game.frame, game.score, game.lives, len(game.missiles), len(game.asteroids),
+            len(game.explosions), len(game.alien_missiles), len(game.hearts),
+            len(game.stars), len(game.power_stars), game.alien_boss is not None)
+
+def bench_parity(args):
+    frames = max(args.frames, 6000)
+    print(f"collision backend parity, {frames} seeded frames: frame, score, lives, entity counts")
+    matched = True
+    for seed in range(5):
+        results = {}
+        for name in se.COLLISION_BACKENDS:
+            game = se.Game(collision=name, seed=seed)
+            game.lives = 50
+            game.run(frames, scripted_inputs(frames))
+            results[name] = game_summary(game)
+        same = len(set(results.values())) == 1
+        matched = matched and same
+        print(f"seed {seed}: {'ok' if same else 'MISMATCH'}  " +
+              "  ".join(f"{name}={summary}" for name, summary in results.items()))
+    return matched
+
+def time_entity_stress(count, collision, dense, frames):
+    rng = random.Random(count)
+    game = se.Game(collision=collision, seed=count)
+    game.lives = 10 ** 9
+    groups = (game.missiles, game.asteroids, game.stars, game.alien_missiles)
+    if not dense:
+        for group in groups:
+            group.dense_at = 10 ** 9
+    elapsed = 0.0
+    for _ in range(frames):
+        keep_asteroids(game, rng, count)
+        while len(game.stars) < count // 10:
+            star = se.Star(rng)
+            star.rect.y = rng.randint(-star.rect.height, se.SCREEN_HEIGHT)
+            game.stars.append(star)
+        while len(game.alien_missiles) < count // 10:
+            game.alien_missiles.append(se.spawn(se.AlienMissile, rng.randint(0, se.SCREEN_WIDTH),
+                                                rng.randint(0, se.SCREEN_HEIGHT)))
+        start = time.perf_counter()
+        game.update(se.NO_KEYS)
+        elapsed += time.perf_counter() - start
+    return elapsed / frames
+
+def bench_entities(args):
+    if se.np is None:
+        print("entity store: numpy not installed")
+        return
+    frames = min(args.frames, 60)
+    print(f"Game.update with N asteroids, N/10 stars and N/10 alien missiles, {frames} frames (ms/frame)")
+    print("     N   backend   objects     store")
+    for count in (1000, 5000, 10000):
+        for collision in ("grid", "numpy"):
+            before = time_entity_stress(count, collision, False, frames)
+            after = time_entity_stress(count, collision, True, frames)
+            print(f"{count:6d}   {collision:>7}  {before * 1000:8.2f}  {after * 1000:8.2f}  {before / after:.1f}x")
+
+class CountingGame(se.Game):
+    def touching(self, a, b):
+        hit = super().touching(a, b)
+        if a.rect.colliderect(b.rect):
+            self.rect_hits += 1
+            self.pixel_hits += hit
+        return hit
+
+def time_mask_stress(count, pixel_collision, frames):
+    rng = random.Random(count)
+    game = CountingGame(seed=count, pixel_collision=pixel_collision)
+    game.lives = 10 ** 9
+    game.rect_hits = game.pixel_hits = 0
+    elapsed = 0.0
+    for _ in range(frames):
+        keep_asteroids(game, rng, count)
+        while len(game.missiles) < count // 4:
+            game.missiles.append(se.spawn(se.Missile, rng.randint(0, se.SCREEN_WIDTH - se.MISSILE_SIZE),
+                                          rng.randint(0, se.SCREEN_HEIGHT)))
+        start = time.perf_counter()
+        game.update(se.NO_KEYS)
+        elapsed += time.perf_counter() - start
+    return elapsed / frames, game.rect_hits / frames, game.pixel_hits / frames
+
+def bench_masks(args):
+    print(f"Game.update with N asteroids and N/4 missiles, {args.frames} frames, rect vs pixel-accurate hits")
+    for count in (50, 200, 1000, 2000):
+        rect_time, _, _ = time_mask_stress(count, False, args.frames)
+        pixel_time, overlaps, hits = time_mask_stress(count, True, args.frames)
+        print(f"{count:5d} asteroids  rect {rect_time * 1000:7.3f} ms  pixel {pixel_time * 1000:7.3f} ms/frame  "
+              f"({overlaps:.1f} rect overlaps/frame, {hits / max(overlaps, 1e-9):.0%} confirmed by masks)")
+    cache = se.rotation_cache
+    print(f"{len(cache.masks)} rotated asteroid masks cached alongside {len(cache.frames)} rotation frames")
+
+def bench_batch(args):
+    games = 16
+    frames = max(args.frames, 3000)
+    cores = os.cpu_count() or 1
+    print(f"batch runner, {games} random-policy games of up to {frames} frames, {cores} CPUs")
+    baseline = None
+    for processes in sorted({1, 2, 4, cores}):
+        start = time.perf_counter()
+        columns = se.run_batch(games, "random", (), frames, processes)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"{processes:3d} processes  {games / elapsed:6.2f} games/s  "
+              f"{sum(columns['frames']) / elapsed:8.0f} frames/s  {baseline / elapsed:.2f}x")
+
+def time_capture(path, frames, save=None):
+    screen = pygame.display.set_mode((se.SCREEN_WIDTH, se.SCREEN_HEIGHT))
+    game = se.Game(screen, seed=0)
+    game.lives = 10 ** 9
+    capture = se.FrameCapture(path, screen) if save is None else None
+    elapsed = 0.0
+    kept = []
+    for frame, keys in enumerate(scripted_inputs(frames)):
+        game.update(keys)
+        game.draw()
+        start = time.perf_counter()
+        if capture is None:
+            save(screen, frame)
+        elif capture.capture(screen):
+            kept.append(screen.get_buffer().raw)
+        elapsed += time.perf_counter() - start
+        time.sleep(1 / se.FPS)
+    if capture is not None:
+        capture.close()
+    return elapsed / frames, kept, capture
+
+def bench_capture(args):
+    frames = args.frames
+    print(f"capture cost on the main thread per frame, {frames} frames paced at {se.FPS} FPS")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "capture.sexv")
+        elapsed, kept, capture = time_capture(path, frames)
+        size = os.path.getsize(path)
+        print(f"{'FrameCapture':>20}: {elapsed * 1000:7.3f} ms/frame  {capture.dropped} dropped  "
+              f"{size / frames / 1024:.1f} KiB/frame")
+        for extension in ("bmp", "png"):
+            save = lambda surface, frame: pygame.image.save(surface, os.path.join(directory, f"{frame}.{extension}"))
+            elapsed, _, _ = time_capture(path, frames, save)
+            print(f"{'image.save ' + extension:>20}: {elapsed * 1000:7.3f} ms/frame")
+            
+        reader = se.CaptureReader(path)
+        start = time.perf_counter()
+        decoded = [bytes(reader.read(position)) for position in range(len(reader))]
+        decode = (time.perf_counter() - start) / len(reader)
+        matched = decoded == kept
+        reader.close()
+        
+        previous = bytearray(kept[-2])
+        frame = bytearray(kept[-1])
+        padded = -(-len(frame) // se.CAPTURE_SEGMENT_BYTES) * se.CAPTURE_SEGMENT_BYTES
+        previous.extend(bytes(padded - len(previous)))
+        frame.extend(bytes(padded - len(frame)))
+        delta = se.np.zeros(padded, se.np.uint8) if se.np is not None else None
+        encode = time_calls(lambda: zlib.compress(se.encode_delta(frame, previous, delta), se.CAPTURE_COMPRESSION), 50)
+        keyframe = time_calls(lambda: zlib.compress(frame, se.CAPTURE_COMPRESSION), 50)
+    print(f"writer thread: delta frame {encode * 1000:.3f} ms, keyframe {keyframe * 1000:.3f} ms; "
+          f"decode {decode * 1000:.3f} ms/frame; round trip {'ok' if matched else 'MISMATCH'}")
+    return matched
+
+def time_collision_play(collision, frames):
+    game = se.Game(collision=collision, seed=3)
+    game.lives = 10 ** 9
+    start = time.perf_counter()
+    game.run(frames, scripted_inputs(frames))
+    return (time.perf_counter() - start) / frames
+
+def bench_collisions(args):
+    backends = [name for name in se.COLLISION_BACKENDS if name != "brute"]
+    print(f"Game.update with N asteroids and N missiles, {args.frames} frames (ms/frame)")
+    print("     N   " + "".join(f"{name:>10}" for name in ["brute"] + backends))
+    frames = max(args.frames, 20000)
+    times = [time_collision_play(name, frames) for name in ["brute"] + backends]
+    print("  play   " + "".join(f"{t * 1000:10.3f}" for t in times) + f"   (seeded play, {frames} frames)")
+    for count in (5, 10, 20, 50, 100, 200, 400, 800):
+        times = [time_collision_stress(name, count, args.frames) for name in ["brute"] + backends]
+        print(f"{count:6d}   " + "".join(f"{t * 1000:10.3f}" for t in times))
+
+def bench_pools(args):
+    frames = max(args.frames, 20000)
+    game = se.Game(seed=0)
+    game.lives = 10 ** 9
+    gc.collect()
+    collections = [stat["collections"] for stat in gc.get_stats()]
+    start = time.perf_counter()
+    game.run(frames, scripted_inputs(frames))
+    elapsed = time.perf_counter() - start
+    collections = [stat["collections"] - before for stat, before in zip(gc.get_stats(), collections)]
+    print(f"entity pools after {frames} frames ({elapsed / frames * 1e6:.1f} us/frame)")
+    for cls, pool in se.pools.items():
+        total = pool.created + pool.reused
+        print(f"{cls.__name__:>13}: {total:6d} spawned, {pool.created:5d} allocated, "
+              f"{pool.reused / max(total, 1):.0%} reused")
+    print("gc collections by generation: " + ", ".join(map(str, collections)))
+
+def time_render(dirty_rects, frames):
+    screen = pygame.display.set_mode((se.SCREEN_WIDTH, se.SCREEN_HEIGHT))
+    front = offscreen()
+    game = se.Game(screen, dirty_rects=dirty_rects, seed=0)
+    game.lives = 10 ** 9
+    draw_time = present_time = 0.0
+    pixels = 0
+    for keys in scripted_inputs(frames):
+        game.update(keys)
+        start = time.perf_counter()
+        rects = game.draw()
+        middle = time.perf_counter()
+        se.present(rects)
+        if rects is None:
+            front.blit(screen, (0, 0))
+            pixels += se.SCREEN_WIDTH * se.SCREEN_HEIGHT
+        else:
+            for rect in rects:
+                front.blit(screen, rect, rect)
+                pixels += rect.width * rect.height
+        end = time.perf_counter()
+        draw_time += middle - start
+        present_time += end - middle
+    return draw_time / frames, present_time / frames, pixels / frames
+
+def bench_render(args):
+    print(f"full flip vs dirty rectangles, {args.frames} frames ({os.environ['SDL_VIDEODRIVER']} video driver;")
+    print("present includes a software copy of the updated regions to stand in for the display)")
+    results = {}
+    for name, dirty_rects in (("full flip", False), ("dirty rects", True)):
+        draw, present, pixels = results[name] = time_render(dirty_rects, args.frames)
+        print(f"{name:>12}: draw {draw * 1000:6.3f} ms  present {present * 1000:6.3f} ms  "
+              f"total {(draw + present) * 1000:6.3f} ms/frame  {pixels / 1000:6.1f}k pixels pushed/frame")
+    full, dirty = (sum(results[name][:2]) for name in ("full flip", "dirty rects"))
+    print(f"dirty rectangles: {full / dirty:.2f}x frame time")
+
+def bench_hud(args):
+    game = se.Game(offscreen(), seed=0)
+    game.lives = 10 ** 9
+    elapsed = 0.0
+    for keys in scripted_inputs(args.frames):
+        game.update(keys)
+        start = time.perf_counter()
+        game.draw()
+        elapsed += time.perf_counter() - start
+    hud = game.hud
+    print(f"HUD text over {args.frames} frames: {hud.renders} font renders "
+          f"({hud.renders / args.frames:.3f}/frame, previously 3-8/frame), "
+          f"{hud.hits / max(hud.hits + hud.renders, 1):.1%} cache hits, "
+          f"{len(hud.surfaces)} cached + {len(hud.static)} static surfaces")
+    print(f"Game.draw {elapsed / args.frames * 1000:.3f} ms/frame")
+
+def time_calls(function, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        function()
+    return (time.perf_counter() - start) / count
+
+def legacy_asteroid():
+    size = random.randint(se.ASTEROID_SIZE_MIN, se.ASTEROID_SIZE_MAX)
+    return se.create_asteroid_image(size, random)
+
+def legacy_star():
+    return se.Star.create_star_image(None)
+
+def bench_sprites(args):
+    count = max(args.frames, 1000)
+    se.sprites.clear()
+    generate = time_calls(se.warm_sprites, 1)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sprites.atlas")
+        se.sprites.save(path)
+        size = os.path.getsize(path)
+        se.sprites.clear()
+        load = time_calls(lambda: se.sprites.load(path), 1)
+    cached = time_calls(se.warm_sprites, 1)
+    print(f"sprite startup: generate {generate * 1000:.2f} ms  atlas load {load * 1000:.2f} ms "
+          f"({size / 1024:.1f} KiB, {len(se.sprites.surfaces)} sprites)  already cached {cached * 1000:.3f} ms")
+    
+    random.seed(0)
+    before = time_calls(legacy_asteroid, count)
+    after = time_calls(lambda: se.recycle(se.spawn(se.Asteroid)), count)
+    print(f"asteroid spawn: drawn per spawn {before * 1e6:.1f} us  variant pool {after * 1e6:.1f} us  "
+          f"{before / after:.0f}x")
+    before = time_calls(legacy_star, count)
+    after = time_calls(se.Star, count)
+    print(f"    star spawn: drawn per spawn {before * 1e6:.1f} us  cached {after * 1e6:.1f} us  "
+          f"{before / after:.0f}x")
+
+def time_process(args, marker, runs=9):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable] + args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                   text=True)
+        ready = None
+        for line in process.stdout:
+            if ready is None and line.startswith(marker):
+                ready = time.perf_counter() - start
+        if process.wait() != 0 or ready is None:
+            raise RuntimeError(f"{' '.join(args)} exited with {process.returncode} before printing {marker!r}")
+        times.append(ready)
+    return sorted(times)[runs // 2]
+
+def bench_startup(args):
+    setups = {
+        "import pygame only": "import pygame",
+        "pygame.init() + SysFont": "import pygame; pygame.init(); pygame.font.SysFont(None, 36)",
+        "display + font init + Font": "import pygame; pygame.display.init(); pygame.font.init(); "
+                                      "pygame.font.Font(None, 36)",
+    }
+    print("process start until ready or the first frame is drawn (teardown excluded), median of 9 runs")
+    for name, code in setups.items():
+        ready = time_process(["-c", code + "; print('ready', flush=True)"], "ready")
+        print(f"{name:>28}: {ready * 1000:7.1f} ms")
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "space-explorer.py")
+    first_frame = time_process([path, "--frames", "1", "--max-fps", "0"], "rendered 1 frames")
+    print(f"{'space-explorer first frame':>28}: {first_frame * 1000:7.1f} ms")
+
+def keep_asteroids(game, rng, count):
+    while len(game.asteroids) < count:
+        asteroid = se.spawn(se.Asteroid, rng)
+        asteroid.rect.y = rng.randint(-asteroid.size, se.SCREEN_HEIGHT - asteroid.size)
+        asteroid.prev_pos = asteroid.rect.topleft
+        game.asteroids.append(asteroid)
+
+def scenario_asteroids(game, rng):
+    keep_asteroids(game, rng, 300)
+
+def scenario_barrage(game, rng):
+    game.powered_up = True
+    game.power_up_time = 0
+    keep_asteroids(game, rng, 40)
+    while len(game.missiles) < 250:
+        missile = se.spawn(se.PowerMissile, rng.randint(0, se.SCREEN_WIDTH - se.MISSILE_SIZE),
+                           rng.randint(0, se.SCREEN_HEIGHT))
+        game.missiles.append(missile)
+
+def scenario_boss(game, rng):
+    if game.alien_boss is None:
+        game.alien_boss = se.AlienBoss()
+        game.alien_boss.shoot_delay = 3
+    game.alien_boss.health = 10 ** 9
+    keep_asteroids(game, rng, 20)
+
+def scenario_explosions(game, rng):
+    while len(game.explosions) < 150:
+        position = (rng.randint(0, se.SCREEN_WIDTH), rng.randint(0, se.SCREEN_HEIGHT))
+        size = rng.choice([20, 30, rng.randint(se.ASTEROID_SIZE_MIN, se.ASTEROID_SIZE_MAX), 100])
+        game.explosions.append(se.spawn(se.Explosion, position, size))
+
+def scenario_starfield(game, rng):
+    if game.star_field.num_stars < 20000:
+        game.star_field = se.create_star_field(20000, game.rng)
+
+SCENARIOS = {
+    "asteroids": scenario_asteroids,
+    "barrage": scenario_barrage,
+    "boss": scenario_boss,
+    "explosions": scenario_explosions,
+    "starfield": scenario_starfield,
+}
+
+def frame_stats(times):
+    times = sorted(times)
+    count = len(times)
+    return {
+        "mean": sum(times) / count * 1000,
+        "p50": times[count // 2] * 1000,
+        "p99": times[min(int(count * 0.99), count - 1)] * 1000,
+        "max": times[-1] * 1000,
+    }
+
+def time_scenario(scenario, frames):
+    rng = random.Random(0)
+    game = se.Game(offscreen(), seed=0)
+    game.lives = 10 ** 9
+    update_times = []
+    draw_times = []
+    for keys in scripted_inputs(frames):
+        scenario(game, rng)
+        start = time.perf_counter()
+        game.update(keys)
+        middle = time.perf_counter()
+        game.draw()
+        end = time.perf_counter()
+        update_times.append(middle - start)
+        draw_times.append(end - middle)
+    return {"update": frame_stats(update_times), "draw": frame_stats(draw_times)}
+
+class ScenarioPipeline(se.SimulationPipeline):
+    def __init__(self, game, scenario):
+        self.scenario = scenario
+        self.rng = random.Random(0)
+        super().__init__(game)
+        
+    def simulate(self, inputs):
+        self.scenario(self.game, self.rng)
+        return super().simulate(inputs)
+
+def time_pipeline(scenario, frames, pipelined):
+    game = se.Game(offscreen(), seed=0)
+    game.lives = 10 ** 9
+    pipeline = ScenarioPipeline(game, scenario)
+    snapshot = se.Snapshot(game)
+    snapshot_time = 0.0
+    start = time.perf_counter()
+    for keys in scripted_inputs(frames):
+        if pipelined:
+            pipeline.submit([keys])
+            game.draw(1.0, pipeline.snapshot)
+            pipeline.wait()
+        else:
+            scenario(game, pipeline.rng)
+            game.update(keys)
+            game.draw()
+            snapshot_start = time.perf_counter()
+            snapshot.capture(game)
+            snapshot_time += time.perf_counter() - snapshot_start
+    elapsed = time.perf_counter() - start - snapshot_time
+    pipeline.close()
+    return elapsed / frames, snapshot_time / frames
+
+def bench_pipeline(args):
+    print(f"serial update + draw vs pipelined simulation thread, {args.frames} frames, "
+          f"{os.cpu_count() or 1} CPUs (ms/frame)")
+    for name, scenario in SCENARIOS.items():
+        serial, snapshot = time_pipeline(scenario, args.frames, False)
+        pipelined, _ = time_pipeline(scenario, args.frames, True)
+        print(f"{name:>12}: serial {serial * 1000:7.3f}  pipelined {pipelined * 1000:7.3f}  "
+              f"({serial / pipelined:.2f}x, snapshot {snapshot * 1000:.3f})")
+
+def time_adaptive(scenario, frames, budget):
+    rng = random.Random(0)
+    game = se.Game(offscreen(), seed=0)
+    game.lives = 10 ** 9
+    se.quality.adaptive = True
+    se.quality.budget = budget
+    se.quality.history.clear()
+    se.quality.set_level(0)
+    for keys in scripted_inputs(frames):
+        scenario(game, rng)
+        start = time.perf_counter()
+        game.update(keys)
+        game.draw()
+        se.quality.record(time.perf_counter() - start)
+    history = list(se.quality.history)
+    se.quality.__init__()
+    return history
+
+def bench_quality(args):
+    levels = range(len(se.QUALITY_LEVELS))
+    print(f"median update + draw per quality level, {args.frames} frames (ms)")
+    full = {}
+    for name, scenario in SCENARIOS.items():
+        medians = []
+        for level in levels:
+            se.quality.set_level(level)
+            stats = time_scenario(scenario, args.frames)
+            medians.append(stats["update"]["p50"] + stats["draw"]["p50"])
+        se.quality.set_level(0)
+        full[name] = medians[0]
+        print(f"{name:>12}: " + "  ".join(f"{level}: {ms:7.3f}" for level, ms in zip(levels, medians)))
+    frames = max(args.frames, se.FPS * 10)
+    print(f"adaptive controller with the budget at 75% of the level 0 median, {frames} frames")
+    for name, scenario in SCENARIOS.items():
+        history = time_adaptive(scenario, frames, full[name] * 0.75 / 1000)
+        changes = ", ".join(f"{old}->{new} @{frame}" for frame, old, new, _ in history) or "none"
+        print(f"{name:>12}: {changes}")
+
+def time_rewind(scenario, frames):
+    rng = random.Random(0)
+    game = se.Game(seed=0)
+    game.lives = 10 ** 9
+    game.rewind = se.RewindBuffer()
+    encode_time = decode_time = 0.0
+    for keys in scripted_inputs(frames):
+        if scenario is not None:
+            scenario(game, rng)
+        game.update(keys)
+        start = time.perf_counter()
+        game.rewind.record(game)
+        encode_time += time.perf_counter() - start
+    restores = len(game.rewind) - 1
+    per_second = game.rewind.bytes_per_second()
+    held = game.rewind.seconds_held()
+    start = time.perf_counter()
+    while game.rewind.restore(game):
+        pass
+    decode_time = time.perf_counter() - start
+    return encode_time / frames, decode_time / max(restores, 1), per_second, held
+
+def bench_rewind(args):
+    frames = max(args.frames, 600)
+    print(f"rewind snapshots, {frames} frames into a {se.REWIND_SECONDS} s buffer of "
+          f"{se.REWIND_SECONDS * se.FPS * se.REWIND_FRAME_BYTES / 1024 ** 2:.1f} MiB")
+    slowest = (0.0, None)
+    for name, scenario in [("normal play", None)] + list(SCENARIOS.items()):
+        encode, decode, per_second, held = time_rewind(scenario, frames)
+        slowest = max(slowest, (decode, name))
+        print(f"{name:>12}: encode {encode * 1e6:7.1f} us  decode {decode * 1e6:7.1f} us  "
+              f"{per_second / se.FPS:8.0f} B/frame  {per_second / 1024:7.1f} KiB/s  "
+              f"({held:.1f} s kept)")
+    decode, name = slowest
+    print(f"slowest decode: {name}, {decode * 1e3:.2f} ms per rewound step, "
+          f"{decode * se.FPS:.1%} of the {1000 / se.FPS:.1f} ms frame at {se.FPS} FPS")
+
+def regressions(report, baseline, threshold):
+    found = []
+    for name, phases in report["scenarios"].items():
+        for phase, stats in phases.items():
+            before = baseline.get("scenarios", {}).get(name, {}).get(phase)
+            if before is not None and stats["p50"] > before["p50"] * (1 + threshold):
+                found.append(f"{name} {phase}: p50 {before['p50']:.3f} -> {stats['p50']:.3f} ms")
+    return found
+
+def bench_suite(args):
+    report = {"frames": args.frames, "scenarios": {}}
+    for name, scenario in SCENARIOS.items():
+        report["scenarios"][name] = time_scenario(scenario, args.frames)
+    print(json.dumps(report, indent=2))
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+    if not args.baseline:
+        return True
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    found = regressions(report, baseline, args.threshold)
+    for regression in found:
+        print(f"regression: {regression}")
+    print(f"{len(found)} regressions over {args.threshold:.0%} against {args.baseline}")
+    return not found
+
+BENCHMARKS = {
+    "batch": bench_batch,
+    "capture": bench_capture,
+    "collisions": bench_collisions,
+    "effects": bench_effects,
+    "entities": bench_entities,
+    "environment": bench_environment,
+    "explosions": bench_explosions,
+    "hud": bench_hud,
+    "masks": bench_masks,
+    "parity": bench_parity,
+    "particles": bench_particles,
+    "pipeline": bench_pipeline,
+    "pools": bench_pools,
+    "quality": bench_quality,
+    "render": bench_render,
+    "rewind": bench_rewind,
+    "rotation": bench_rotation,
+    "sprites": bench_sprites,
+    "startup": bench_startup,
+    "starfield": bench_starfield,
+    "suite": bench_suite,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Space Explorer benchmarks")
+    parser.add_argument("benchmarks", nargs="*", metavar="benchmark",
+                        help=f"benchmarks to run, from: {', '.join(sorted(BENCHMARKS))} (default: all)")
+    parser.add_argument("--frames", type=int, default=240,
+                        help="frames to simulate per measurement")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="suite: fail when a scenario's median update or draw time regresses against FILE")
+    parser.add_argument("--save-baseline", metavar="FILE",
+                        help="suite: store the report in FILE for later --baseline runs")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="suite: allowed slowdown before a regression fails (default 0.25 = 25%%)")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(sorted(unknown))}")
+        
+    pygame.display.init()
+    pygame.font.init()
+    failed = []
+    for name in args.benchmarks or sorted(BENCHMARKS):
+        if BENCHMARKS[name](args) is False:
+            failed.append(name)
+        print()
+    if failed:
+        sys.exit(f"failed: {', '.join(failed)}")
+
+if __name__ == "__main__":
+    main()
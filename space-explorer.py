@@ -2,8 +2,28 @@ import pygame
 import random
 import sys
 import math
+import time
+import argparse
+import gc
+import itertools
+import bisect
+import copy
+import os
+import struct
+import zlib
+import json
+import csv
+import multiprocessing
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from array import array
+from collections import OrderedDict, deque
 
-pygame.init()
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
@@ -27,17 +47,601 @@ ASTEROID_SPAWN_RATE = 30
 STAR_SPEED = 3
 STAR_SIZE = 20
 STAR_SPAWN_RATE = 90
+STAR_FIELD_COUNT = 100
+STAR_FIELD_SUBPIXELS = 256
 
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption("Space Explorer")
-clock = pygame.time.Clock()
+SIMULATION_RATE = FPS
+MAX_CATCH_UP_STEPS = 5
+MAX_RENDER_FPS = 240
+
+COLLISION_CELL_SIZE = 64
+COLLISION_GRID_MIN_PAIRS = 160000
+
+DIRTY_RECT_LIMIT = 600
+
+ROTATION_STEPS = 64
+ROTATION_CACHE_BYTES = 64 * 1024 * 1024
+
+TEXT_CACHE_SIZE = 64
+
+EXPLOSION_FRAMES = 12
+EXPLOSION_SIZE_STEP = 5
+EXPLOSION_CACHE_BUCKETS = 16
+
+PARTICLE_LIMIT = 4096
+PARTICLE_FADE_STEPS = 8
+PARTICLE_DRAG = 0.95
+PARTICLE_KINDS = {
+    "fire": ((255, 150, 40), 4),
+    "spark": ((255, 240, 190), 2),
+    "exhaust": ((80, 150, 255), 3),
+    "alien exhaust": ((255, 60, 30), 3),
+}
+PARTICLE_KIND_INDEX = {kind: index for index, kind in enumerate(PARTICLE_KINDS)}
+PARTICLE_EMITTERS = {
+    "asteroid": (("fire", 24, 0.5, 3.0, 20, 40, 0.0, math.pi), ("spark", 12, 2.0, 6.0, 10, 25, 0.0, math.pi)),
+    "hit": (("spark", 10, 1.0, 4.0, 8, 18, 0.0, math.pi),),
+    "boss": (("fire", 160, 0.5, 6.0, 30, 70, 0.0, math.pi), ("spark", 80, 3.0, 9.0, 20, 45, 0.0, math.pi)),
+    "exhaust": (("exhaust", 2, 1.5, 3.0, 8, 16, math.pi / 2, 0.3),),
+    "alien exhaust": (("alien exhaust", 2, 1.0, 2.5, 8, 14, math.pi / 2, 0.4),),
+}
+
+PROFILE_HISTORY = 240
+PROFILE_AVERAGE = 30
+PROFILE_GRAPH_HEIGHT = 60
+
+QUALITY_BUDGET = 1 / SIMULATION_RATE
+QUALITY_WINDOW = 30
+QUALITY_LOWER = 0.9
+QUALITY_RAISE = 0.5
+QUALITY_RAISE_FRAMES = FPS * 2
+QUALITY_RAISE_FRAMES_MAX = FPS * 30
+QUALITY_HISTORY = 64
+
+ASTEROID_VARIANTS = 64
+
+ENTITY_STORE_DENSE = 64
+
+SPRITE_ATLAS_MAGIC = b"SEXA"
+SPRITE_ATLAS_VERSION = 1
+SPRITE_ATLAS_HEADER = struct.Struct("<4sBI")
+
+BATCH_PARAMETERS = ("asteroid_spawn_rate", "boss_appears_at", "boss_health", "boss_spawn_interval",
+                    "lives", "power_star_spawn_rate", "power_up_duration")
+BATCH_COLUMNS = ("seed", "score", "frames", "bosses_killed", "lives")
+BATCH_GAME_FRAMES = FPS * 60 * 10
+POLICY_HOLD_FRAMES = 10
+
+ENV_ACTIONS = 32
+ENV_STATE_SLOTS = 8
+ENV_STATE_GROUPS = ("asteroids", "alien_missiles", "stars", "power_stars", "hearts")
+ENV_STATE_HEADER = 8
+ENV_STATE_SIZE = ENV_STATE_HEADER + len(ENV_STATE_GROUPS) * ENV_STATE_SLOTS * 3
+
+REWIND_SECONDS = 10
+REWIND_FRAME_BYTES = 4096
+REWIND_GAME_FIELDS = ("frame", "score", "lives", "game_over", "asteroid_timer", "star_timer", "power_star_timer",
+                      "asteroid_spawn_rate", "power_star_spawn_rate", "powered_up", "power_up_time",
+                      "power_up_duration", "boss_appears_at", "boss_spawn_interval", "boss_health", "bosses_killed")
+REWIND_GAME = struct.Struct("<Iii?iiidd?iiiiii")
+REWIND_PLAYER = struct.Struct("<hhB")
+REWIND_COUNTS = struct.Struct("<7H?")
+REWIND_MISSILE = struct.Struct("<?hh")
+REWIND_ASTEROID = struct.Struct("<BhhBdd")
+REWIND_EXPLOSION = struct.Struct("<hhBBB")
+REWIND_POSITION = struct.Struct("<hh")
+REWIND_PULSE = struct.Struct("<hhdb")
+REWIND_BOSS = struct.Struct("<hhiibiiB")
+REWIND_STAR_FIELD = struct.Struct("<IQQ16s16s?I")
+REWIND_STAR_LIST = struct.Struct("<IQQ")
+REWIND_STAR = struct.Struct("<hddBB")
+REWIND_STAR_UNDO = struct.Struct("<BBI")
+REWIND_RANDOM = struct.Struct("<625I")
+REWIND_UNDO_NONE = 0
+REWIND_UNDO_DELTA = 1
+REWIND_UNDO_KEYFRAME = 2
+REWIND_UNDO_SIZE = struct.Struct("<I")
+REWIND_COLUMNS = {
+    REWIND_MISSILE: ("power", "x", "y"),
+    REWIND_ASTEROID: ("variant", "x", "y", "speed", "rotation", "spin"),
+    REWIND_POSITION: ("x", "y"),
+    REWIND_PULSE: ("x", "y", "pulse", "pulse_dir"),
+}
+
+CAPTURE_MAGIC = b"SEXV"
+CAPTURE_VERSION = 1
+CAPTURE_HEADER = struct.Struct("<4sBHHIB4I")
+CAPTURE_INDEX_ENTRY = struct.Struct("<QIIdB")
+CAPTURE_TRAILER = struct.Struct("<QI")
+CAPTURE_BUFFERS = 8
+CAPTURE_SEGMENT_BYTES = 128
+CAPTURE_KEYFRAME_INTERVAL = FPS
+CAPTURE_COMPRESSION = 1
+CAPTURE_SEEK_SECONDS = 5
+
+RECORDING_MAGIC = b"SEXR"
+RECORDING_VERSION = 3
+RECORDING_HEADER = struct.Struct("<4sBBQIiiH")
+RECORDING_PIXEL_COLLISION = 1
+
+class KeyState:
+    def __init__(self, pressed=()):
+        self.pressed = frozenset(pressed)
+        
+    def __getitem__(self, key):
+        return key in self.pressed
+
+NO_KEYS = KeyState()
+
+KEY_BITS = (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN, pygame.K_SPACE, pygame.K_r,
+            pygame.K_BACKSPACE)
+
+def key_mask(keys):
+    mask = 0
+    for bit, key in enumerate(KEY_BITS):
+        if keys[key]:
+            mask |= 1 << bit
+    return mask
+
+MASK_KEYS = [KeyState(key for bit, key in enumerate(KEY_BITS) if mask & (1 << bit))
+             for mask in range(1 << len(KEY_BITS))]
+
+class FrameRandom(random.Random):
+    def __init__(self, seed):
+        self.base_seed = seed
+        self.frame = 0
+        self.pending = False
+        super().__init__(seed << 40)
+        
+    def begin_frame(self, frame):
+        self.frame = frame
+        self.pending = True
+        
+    def reseed(self):
+        self.pending = False
+        super().seed((self.base_seed << 40) | self.frame)
+        
+    def random(self):
+        if self.pending:
+            self.reseed()
+        return super().random()
+        
+    def getrandbits(self, k):
+        if self.pending:
+            self.reseed()
+        return super().getrandbits(k)
+
+class RotationCache:
+    def __init__(self, steps=ROTATION_STEPS, max_bytes=ROTATION_CACHE_BYTES):
+        self.steps = steps
+        self.max_bytes = max_bytes
+        self.frames = OrderedDict()
+        self.masks = {}
+        self.lock = threading.RLock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        
+    def step_for(self, angle):
+        return int(angle * self.steps / 360 + 0.5) % self.steps
+        
+    def get(self, key, image, angle):
+        frame_key = (key, self.step_for(angle))
+        with self.lock:
+            frame = self.frames.get(frame_key)
+            if frame is not None:
+                self.frames.move_to_end(frame_key)
+                self.hits += 1
+                return frame
+                
+            self.misses += 1
+            frame = pygame.transform.rotate(image, frame_key[1] * 360 / self.steps)
+            self.frames[frame_key] = frame
+            self.bytes += self.frame_bytes(frame)
+            while self.bytes > self.max_bytes and len(self.frames) > 1:
+                evicted_key, evicted = self.frames.popitem(last=False)
+                self.masks.pop(evicted_key, None)
+                self.bytes -= self.frame_bytes(evicted)
+            return frame
+            
+    def mask(self, key, image, angle):
+        frame_key = (key, self.step_for(angle))
+        with self.lock:
+            mask = self.masks.get(frame_key)
+            if mask is None:
+                mask = self.masks[frame_key] = pygame.mask.from_surface(self.get(key, image, angle))
+            return mask
+        
+    def frame_bytes(self, frame):
+        return frame.get_width() * frame.get_height() * frame.get_bytesize()
+        
+    def clear(self):
+        self.frames.clear()
+        self.masks.clear()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+rotation_cache = RotationCache()
+
+class SpriteCache:
+    def __init__(self):
+        self.surfaces = {}
+        self.masks = {}
+        self.generated = 0
+        
+    def get(self, name, factory):
+        surface = self.surfaces.get(name)
+        if surface is None:
+            surface = self.surfaces[name] = factory()
+            self.generated += 1
+        return surface
+        
+    def mask(self, name):
+        mask = self.masks.get(name)
+        if mask is None:
+            mask = self.masks[name] = pygame.mask.from_surface(self.surfaces[name])
+        return mask
+        
+    def rect_mask(self, size):
+        mask = self.masks.get(size)
+        if mask is None:
+            mask = self.masks[size] = pygame.mask.Mask(size, fill=True)
+        return mask
+        
+    def asteroid(self, variant):
+        return self.get(f"asteroid {variant}", lambda: create_asteroid_variant(variant))
+        
+    def signature(self):
+        masks = pygame.Surface((1, 1), pygame.SRCALPHA).get_masks()
+        return {"pygame": pygame.version.ver, "byteorder": sys.byteorder, "masks": list(masks),
+                "asteroid variants": ASTEROID_VARIANTS}
+        
+    def save(self, path):
+        names = sorted(self.surfaces)
+        index = json.dumps({
+            "signature": self.signature(),
+            "sprites": [[name, *self.surfaces[name].get_size()] for name in names],
+        }).encode()
+        pixels = zlib.compress(b"".join(self.surfaces[name].get_buffer().raw for name in names))
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(SPRITE_ATLAS_HEADER.pack(SPRITE_ATLAS_MAGIC, SPRITE_ATLAS_VERSION, len(index)))
+            f.write(index)
+            f.write(pixels)
+        os.replace(temporary, path)
+        
+    def load(self, path):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            magic, version, index_size = SPRITE_ATLAS_HEADER.unpack_from(data)
+            if magic != SPRITE_ATLAS_MAGIC or version != SPRITE_ATLAS_VERSION:
+                return False
+            start = SPRITE_ATLAS_HEADER.size
+            index = json.loads(data[start:start + index_size])
+            if index["signature"] != self.signature():
+                return False
+            pixels = zlib.decompress(data[start + index_size:])
+            surfaces = {name: pygame.Surface((width, height), pygame.SRCALPHA)
+                        for name, width, height in index["sprites"]}
+        except (OSError, struct.error, ValueError, TypeError, KeyError, zlib.error, pygame.error):
+            return False
+        if sum(surface.get_buffer().length for surface in surfaces.values()) != len(pixels):
+            return False
+        offset = 0
+        for surface in surfaces.values():
+            buffer = surface.get_buffer()
+            buffer.write(pixels[offset:offset + buffer.length])
+            offset += buffer.length
+        self.surfaces.update(surfaces)
+        return True
+        
+    def clear(self):
+        self.surfaces.clear()
+        self.masks.clear()
+        self.generated = 0
+
+sprites = SpriteCache()
+
+class EffectAtlas:
+    def __init__(self):
+        self.surfaces = {}
+        
+    def glow(self, size, color):
+        key = ("glow", size, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = pygame.Surface((size, size), pygame.SRCALPHA)
+            pygame.draw.circle(surface, color, (size // 2, size // 2), size // 2)
+            self.surfaces[key] = surface
+        return surface
+        
+    def trail(self, size, color, points):
+        key = ("trail", size, color, points)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = pygame.Surface(size, pygame.SRCALPHA)
+            pygame.draw.polygon(surface, color, points)
+            self.surfaces[key] = surface
+        return surface
+        
+    def clear(self):
+        self.surfaces.clear()
+
+effects = EffectAtlas()
+
+fonts = {}
+
+def default_font(size):
+    font = fonts.get(size)
+    if font is None:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        font = fonts[size] = pygame.font.Font(None, size)
+    return font
+
+class TextCache:
+    def __init__(self, font, max_entries=TEXT_CACHE_SIZE):
+        self.font = font
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.static = {}
+        self.renders = 0
+        self.hits = 0
+        
+    def render(self, text, color):
+        key = (text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+            
+        surface = self.font.render(text, True, color)
+        self.renders += 1
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+        
+    def render_static(self, text, color):
+        key = (text, color)
+        surface = self.static.get(key)
+        if surface is not None:
+            self.hits += 1
+            return surface
+            
+        surface = self.static[key] = self.font.render(text, True, color)
+        self.renders += 1
+        return surface
+
+def blend_over(top, bottom):
+    top_alpha = top[3] / 255
+    bottom_alpha = bottom[3] / 255 * (1 - top_alpha)
+    alpha = top_alpha + bottom_alpha
+    if alpha == 0:
+        return (0, 0, 0, 0)
+    color = [round((t * top_alpha + b * bottom_alpha) / alpha) for t, b in zip(top[:3], bottom[:3])]
+    return (*color, round(alpha * 255))
+
+class ExplosionFrames:
+    def __init__(self, frame_count=EXPLOSION_FRAMES, step=EXPLOSION_SIZE_STEP, max_buckets=EXPLOSION_CACHE_BUCKETS):
+        self.frame_count = frame_count
+        self.step = step
+        self.max_buckets = max_buckets
+        self.strips = OrderedDict()
+        
+    def bucket(self, size):
+        return max(self.step, int(size / self.step + 0.5) * self.step)
+        
+    def get(self, size, frame):
+        bucket = self.bucket(size)
+        strip = self.strips.get(bucket)
+        if strip is None:
+            strip = [self.render(bucket, i) for i in range(self.frame_count)]
+            self.strips[bucket] = strip
+            if len(self.strips) > self.max_buckets:
+                self.strips.popitem(last=False)
+        else:
+            self.strips.move_to_end(bucket)
+        return strip[frame]
+        
+    def render(self, size, frame):
+        current_size = int(size * (1 - frame / self.frame_count))
+        
+        inner, middle, outer = [
+            (255, 200, 0, 255 - (255 * frame // self.frame_count)),
+            (255, 100, 0, 200 - (200 * frame // self.frame_count)),
+            (255, 0, 0, 150 - (150 * frame // self.frame_count))
+        ]
+        
+        image = pygame.Surface((current_size * 2, current_size * 2), pygame.SRCALPHA)
+        center = (current_size, current_size)
+        pygame.draw.circle(image, outer, center, current_size)
+        pygame.draw.circle(image, blend_over(outer, middle), center, int(current_size * 0.8))
+        pygame.draw.circle(image, blend_over(outer, blend_over(middle, inner)), center, int(current_size * 0.6))
+        return image
+        
+    def clear(self):
+        self.strips.clear()
+
+explosion_frames = ExplosionFrames()
+
+class QualityLevel:
+    def __init__(self, star_stride, glow, lightning, max_explosions, particles):
+        self.star_stride = star_stride
+        self.glow = glow
+        self.lightning = lightning
+        self.max_explosions = max_explosions
+        self.particles = particles
+
+QUALITY_LEVELS = (
+    QualityLevel(1, True, 3, None, 1.0),
+    QualityLevel(2, True, 2, 24, 0.75),
+    QualityLevel(2, False, 1, 12, 0.5),
+    QualityLevel(4, False, 0, 6, 0.25),
+)
+
+class QualityController:
+    def __init__(self, level=0, adaptive=False, budget=QUALITY_BUDGET, window=QUALITY_WINDOW):
+        self.adaptive = adaptive
+        self.budget = budget
+        self.window = window
+        self.history = deque(maxlen=QUALITY_HISTORY)
+        self.frames = 0
+        self.raise_frames = QUALITY_RAISE_FRAMES
+        self.set_level(level)
+        
+    def set_level(self, level):
+        self.level = level
+        self.settings = QUALITY_LEVELS[level]
+        self.times = array("d", bytes(8 * self.window))
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+        self.headroom = 0
+        self.changed_at = self.frames
+        
+    def average(self):
+        return self.total / max(self.count, 1)
+        
+    def record(self, elapsed):
+        self.frames += 1
+        times = self.times
+        self.total += elapsed - times[self.index]
+        times[self.index] = elapsed
+        self.index = (self.index + 1) % self.window
+        self.count = min(self.count + 1, self.window)
+        if not self.adaptive or self.count < self.window:
+            return False
+        average = self.average()
+        self.headroom = self.headroom + 1 if average < self.budget * QUALITY_RAISE else 0
+        if average > self.budget * QUALITY_LOWER and self.level < len(QUALITY_LEVELS) - 1:
+            raised = self.history and self.history[-1][2] < self.history[-1][1]
+            if raised and self.frames - self.changed_at < self.raise_frames:
+                self.raise_frames = min(self.raise_frames * 2, QUALITY_RAISE_FRAMES_MAX)
+            level = self.level + 1
+        elif self.headroom >= self.raise_frames and self.level > 0:
+            level = self.level - 1
+        else:
+            return False
+        self.history.append((self.frames, self.level, level, average))
+        self.set_level(level)
+        return True
+
+quality = QualityController()
+
+class SpatialHash:
+    def __init__(self, width=SCREEN_WIDTH, height=SCREEN_HEIGHT, cell_size=COLLISION_CELL_SIZE):
+        self.cell_size = cell_size
+        self.columns = -(-width // cell_size)
+        self.rows = -(-height // cell_size)
+        self.cells = [[] for _ in range(self.columns * self.rows)]
+        self.used = []
+        self.items = []
+        
+    def cell_span(self, rect):
+        size = self.cell_size
+        left = min(max(rect.left // size, 0), self.columns - 1)
+        right = min(max((rect.right - 1) // size, 0), self.columns - 1)
+        top = min(max(rect.top // size, 0), self.rows - 1)
+        bottom = min(max((rect.bottom - 1) // size, 0), self.rows - 1)
+        return left, right, top, bottom
+        
+    def cell_spans(self, items):
+        if not isinstance(items, EntityStore) or not items.dense:
+            return [self.cell_span(item.rect) for item in items]
+        x, y, width, height = items.rect_array().T
+        size = self.cell_size
+        spans = (np.clip(x // size, 0, self.columns - 1), np.clip((x + width - 1) // size, 0, self.columns - 1),
+                 np.clip(y // size, 0, self.rows - 1), np.clip((y + height - 1) // size, 0, self.rows - 1))
+        return zip(*(span.tolist() for span in spans))
+        
+    def rebuild(self, items):
+        cells = self.cells
+        for index in self.used:
+            cells[index].clear()
+        used = self.used = []
+        columns = self.columns
+        for item_index, (left, right, top, bottom) in enumerate(self.cell_spans(items)):
+            for row in range(top * columns, bottom * columns + 1, columns):
+                for index in range(row + left, row + right + 1):
+                    cell = cells[index]
+                    if not cell:
+                        used.append(index)
+                    cell.append(item_index)
+        self.items = items
+        
+    def query(self, rect):
+        left, right, top, bottom = self.cell_span(rect)
+        cells = self.cells
+        columns = self.columns
+        if left == right and top == bottom:
+            found = cells[top * columns + left]
+        else:
+            found = set()
+            for row in range(top * columns, bottom * columns + 1, columns):
+                for index in range(row + left, row + right + 1):
+                    found.update(cells[index])
+            found = sorted(found)
+        items = self.items
+        return [items[index] for index in found]
+        
+    def pairs(self, group_a, group_b):
+        if len(group_a) * len(group_b) < COLLISION_GRID_MIN_PAIRS:
+            rects = [b.rect for b in group_b]
+            for a in group_a:
+                for index in a.rect.collidelistall(rects):
+                    yield a, group_b[index]
+            return
+        self.rebuild(group_b)
+        for a in group_a:
+            for b in self.query(a.rect):
+                yield a, b
+
+class BruteForcePairs:
+    def pairs(self, group_a, group_b):
+        for a in group_a:
+            for b in group_b:
+                yield a, b
+
+class NumpyPairs:
+    def rect_array(self, group):
+        if isinstance(group, EntityStore):
+            return group.rect_array()
+        rects = itertools.chain.from_iterable(entity.rect for entity in group)
+        return np.fromiter(rects, dtype=np.int64, count=len(group) * 4).reshape(-1, 4)
+        
+    def overlaps(self, group_a, group_b):
+        a = self.rect_array(group_a)
+        b = self.rect_array(group_b)
+        ax, ay, aw, ah = (a[:, i, None] for i in range(4))
+        bx, by, bw, bh = b.T
+        return ((ax < bx + bw) & (ax + aw > bx) & (ay < by + bh) & (ay + ah > by)
+                & (aw > 0) & (ah > 0) & (bw > 0) & (bh > 0))
+        
+    def pairs(self, group_a, group_b):
+        if not group_a or not group_b:
+            return
+        rows, columns = np.nonzero(self.overlaps(group_a, group_b))
+        for row, column in zip(rows.tolist(), columns.tolist()):
+            yield group_a[row], group_b[column]
+
+COLLISION_BACKENDS = {
+    "grid": SpatialHash,
+    "brute": BruteForcePairs,
+}
+if np is not None:
+    COLLISION_BACKENDS["numpy"] = NumpyPairs
 
 class Player:
     def __init__(self):
         self.size = PLAYER_SIZE
-        self.image = self.create_spaceship_image()
+        self.image = sprites.get("player", self.create_spaceship_image)
         self.rect = self.image.get_rect()
         self.rect.center = (SCREEN_WIDTH // 2, SCREEN_HEIGHT - 100)
+        self.prev_pos = self.rect.topleft
         self.speed = PLAYER_SPEED
         self.cooldown = 0
         
@@ -71,6 +675,7 @@ class Player:
         return image
         
     def update(self, keys):
+        self.prev_pos = self.rect.topleft
         if keys[pygame.K_LEFT] and self.rect.left > 0:
             self.rect.x -= self.speed
         if keys[pygame.K_RIGHT] and self.rect.right < SCREEN_WIDTH:
@@ -88,53 +693,74 @@ class Player:
             self.cooldown = PLAYER_COOLDOWN
             missile_x = self.rect.centerx - MISSILE_SIZE // 2
             missile_y = self.rect.top
-            return Missile(missile_x, missile_y)
+            return spawn(Missile, missile_x, missile_y)
         return None
             
+    def collision_mask(self):
+        return sprites.mask("player"), self.rect.topleft
+        
     def draw(self, surface):
-        surface.blit(self.image, self.rect)
+        return surface.blit(self.image, self.rect)
 
 class Missile:
     def __init__(self, x, y):
         self.rect = pygame.Rect(x, y, MISSILE_SIZE, MISSILE_SIZE * 1.5)
+        self.prev_pos = (x, y)
         self.speed = MISSILE_SPEED
         
+    def reset(self, x, y):
+        self.rect.topleft = (x, y)
+        self.prev_pos = (x, y)
+        
     def update(self):
+        self.prev_pos = self.rect.topleft
         self.rect.y -= self.speed
         return self.rect.bottom < 0
         
+    def collision_mask(self):
+        return sprites.rect_mask(self.rect.size), self.rect.topleft
+        
     def draw(self, surface):
-        pygame.draw.rect(surface, MISSILE_COLOR, self.rect)
+        body_rect = pygame.draw.rect(surface, MISSILE_COLOR, self.rect)
         
-        pygame.draw.polygon(surface, (255, 200, 0), [
+        tip_rect = pygame.draw.polygon(surface, (255, 200, 0), [
             (self.rect.left, self.rect.top + MISSILE_SIZE * 0.5),
             (self.rect.centerx, self.rect.top),
             (self.rect.right, self.rect.top + MISSILE_SIZE * 0.5)
         ])
         
         trail_color = (255, 200, 100, 128)
-        trail_surface = pygame.Surface((MISSILE_SIZE, MISSILE_SIZE), pygame.SRCALPHA)
-        pygame.draw.polygon(trail_surface, trail_color, [
+        trail_surface = effects.trail((MISSILE_SIZE, MISSILE_SIZE), trail_color, (
             (0, 0),
             (MISSILE_SIZE // 2, MISSILE_SIZE),
             (MISSILE_SIZE, 0)
-        ])
-        surface.blit(trail_surface, (self.rect.left, self.rect.bottom))
+        ))
+        trail_rect = surface.blit(trail_surface, (self.rect.left, self.rect.bottom))
+        return body_rect.unionall((tip_rect, trail_rect))
 
 class PowerMissile:
     def __init__(self, x, y):
         self.rect = pygame.Rect(x, y, MISSILE_SIZE * 1.5, MISSILE_SIZE * 2)
+        self.prev_pos = (x, y)
         self.speed = MISSILE_SPEED + 1
         
+    def reset(self, x, y):
+        self.rect.topleft = (x, y)
+        self.prev_pos = (x, y)
+        
     def update(self):
+        self.prev_pos = self.rect.topleft
         self.rect.y -= self.speed
         return self.rect.bottom < 0
         
+    def collision_mask(self):
+        return sprites.rect_mask(self.rect.size), self.rect.topleft
+        
     def draw(self, surface):
         core_color = (50, 150, 255)
         outer_color = (150, 200, 255)
         
-        pygame.draw.rect(surface, outer_color, self.rect)
+        body_rect = pygame.draw.rect(surface, outer_color, self.rect)
         
         inner_rect = pygame.Rect(
             self.rect.left + self.rect.width * 0.25,
@@ -144,77 +770,88 @@ class PowerMissile:
         )
         pygame.draw.rect(surface, core_color, inner_rect)
         
-        for _ in range(3):
+        drawn = []
+        for _ in range(quality.settings.lightning):
             start_x = random.randint(self.rect.left, self.rect.right)
             end_x = random.randint(self.rect.left, self.rect.right)
-            pygame.draw.line(surface, (255, 255, 255), 
-                            (start_x, self.rect.top + 5), 
-                            (end_x, self.rect.bottom - 5), 2)
+            drawn.append(pygame.draw.line(surface, (255, 255, 255), 
+                                          (start_x, self.rect.top + 5), 
+                                          (end_x, self.rect.bottom - 5), 2))
         
-        pygame.draw.polygon(surface, (200, 230, 255), [
+        drawn.append(pygame.draw.polygon(surface, (200, 230, 255), [
             (self.rect.left, self.rect.top + MISSILE_SIZE * 0.5),
             (self.rect.centerx, self.rect.top),
             (self.rect.right, self.rect.top + MISSILE_SIZE * 0.5)
-        ])
+        ]))
         
         trail_color = (100, 200, 255, 150)
-        trail_surface = pygame.Surface((self.rect.width * 2, self.rect.height), pygame.SRCALPHA)
-        pygame.draw.polygon(trail_surface, trail_color, [
+        trail_surface = effects.trail((self.rect.width * 2, self.rect.height), trail_color, (
             (self.rect.width // 2, 0),
             (0, self.rect.height),
             (self.rect.width, self.rect.height)
-        ])
-        surface.blit(trail_surface, 
-                    (self.rect.left - self.rect.width // 4, self.rect.bottom))
+        ))
+        drawn.append(surface.blit(trail_surface, 
+                                  (self.rect.left - self.rect.width // 4, self.rect.bottom)))
+        return body_rect.unionall(drawn)
+
+
+def create_asteroid_image(size, rng):
+    image = pygame.Surface((size, size), pygame.SRCALPHA)
+    
+    base_color = (139, 69, 19)
+    
+    num_points = rng.randint(8, 12)
+    points = []
+    center = (size // 2, size // 2)
+    
+    for i in range(num_points):
+        angle = 2 * math.pi * i / num_points
+        distance = rng.uniform(0.6, 1.0) * size // 2
+        x = center[0] + distance * math.cos(angle)
+        y = center[1] + distance * math.sin(angle)
+        points.append((x, y))
+        
+    pygame.draw.polygon(image, base_color, points)
+    
+    for _ in range(num_points // 2):
+        crater_size = rng.randint(size // 10, size // 6)
+        crater_x = rng.randint(crater_size, size - crater_size)
+        crater_y = rng.randint(crater_size, size - crater_size)
+        
+        center_to_crater = math.sqrt((crater_x - center[0])**2 + (crater_y - center[1])**2)
+        if center_to_crater < (size // 2) * 0.7:
+            crater_color = (100, 50, 50)
+            pygame.draw.circle(image, crater_color, (crater_x, crater_y), crater_size)
+            
+            highlight_color = (169, 99, 49)
+            pygame.draw.circle(image, highlight_color, 
+                               (crater_x - crater_size//4, crater_y - crater_size//4), 
+                               crater_size//4)
+            
+    return image
 
+def create_asteroid_variant(variant):
+    rng = random.Random(variant)
+    return create_asteroid_image(rng.randint(ASTEROID_SIZE_MIN, ASTEROID_SIZE_MAX), rng)
 
 class Asteroid:
-    def __init__(self):
-        self.size = random.randint(ASTEROID_SIZE_MIN, ASTEROID_SIZE_MAX)
-        self.image = self.create_asteroid_image()
+    def __init__(self, rng=random):
+        self.reset(rng)
+        
+    def reset(self, rng=random):
+        self.variant = rng.randrange(ASTEROID_VARIANTS)
+        self.image = sprites.asteroid(self.variant)
+        self.size = self.image.get_width()
         self.rect = self.image.get_rect()
-        self.rect.x = random.randint(0, SCREEN_WIDTH - self.size)
+        self.rect.x = rng.randint(0, SCREEN_WIDTH - self.size)
         self.rect.y = -self.size
-        self.speed = random.randint(ASTEROID_SPEED_MIN, ASTEROID_SPEED_MAX)
+        self.prev_pos = self.rect.topleft
+        self.speed = rng.randint(ASTEROID_SPEED_MIN, ASTEROID_SPEED_MAX)
         self.rotation = 0
-        self.rotation_speed = random.uniform(-2, 2)
-        
-    def create_asteroid_image(self):
-        image = pygame.Surface((self.size, self.size), pygame.SRCALPHA)
-        
-        base_color = (139, 69, 19)
-        
-        num_points = random.randint(8, 12)
-        points = []
-        center = (self.size // 2, self.size // 2)
-        
-        for i in range(num_points):
-            angle = 2 * math.pi * i / num_points
-            distance = random.uniform(0.6, 1.0) * self.size // 2
-            x = center[0] + distance * math.cos(angle)
-            y = center[1] + distance * math.sin(angle)
-            points.append((x, y))
-            
-        pygame.draw.polygon(image, base_color, points)
-        
-        for _ in range(num_points // 2):
-            crater_size = random.randint(self.size // 10, self.size // 6)
-            crater_x = random.randint(crater_size, self.size - crater_size)
-            crater_y = random.randint(crater_size, self.size - crater_size)
-            
-            center_to_crater = math.sqrt((crater_x - center[0])**2 + (crater_y - center[1])**2)
-            if center_to_crater < (self.size // 2) * 0.7:
-                crater_color = (100, 50, 50)
-                pygame.draw.circle(image, crater_color, (crater_x, crater_y), crater_size)
-                
-                highlight_color = (169, 99, 49)
-                pygame.draw.circle(image, highlight_color, 
-                                   (crater_x - crater_size//4, crater_y - crater_size//4), 
-                                   crater_size//4)
-                
-        return image
+        self.rotation_speed = rng.uniform(-2, 2)
         
     def update(self):
+        self.prev_pos = self.rect.topleft
         self.rect.y += self.speed
         
         self.rotation += self.rotation_speed
@@ -225,17 +862,24 @@ class Asteroid:
             
         return self.rect.top > SCREEN_HEIGHT
         
+    def collision_mask(self):
+        mask = rotation_cache.mask(self.variant, self.image, self.rotation)
+        return mask, mask.get_rect(center=self.rect.center).topleft
+        
     def draw(self, surface):
-        rotated_image = pygame.transform.rotate(self.image, self.rotation)
+        rotated_image = rotation_cache.get(self.variant, self.image, self.rotation)
         rotated_rect = rotated_image.get_rect(center=self.rect.center)
-        surface.blit(rotated_image, rotated_rect)
+        return surface.blit(rotated_image, rotated_rect)
 
 class Explosion:
     def __init__(self, position, size):
+        self.reset(position, size)
+        
+    def reset(self, position, size):
         self.position = position
         self.size = size
         self.current_frame = 0
-        self.max_frames = 12
+        self.max_frames = EXPLOSION_FRAMES
         self.frames_per_update = 2
         self.frame_counter = 0
         
@@ -247,29 +891,207 @@ class Explosion:
         return self.current_frame >= self.max_frames
         
     def draw(self, surface):
-        current_size = int(self.size * (1 - self.current_frame / self.max_frames))
-        
-        colors = [
-            (255, 200, 0, 255 - (255 * self.current_frame // self.max_frames)),
-            (255, 100, 0, 200 - (200 * self.current_frame // self.max_frames)),
-            (255, 0, 0, 150 - (150 * self.current_frame // self.max_frames))
-        ]
-        
-        for i, color in enumerate(colors):
-            explosion_surf = pygame.Surface((current_size * 2, current_size * 2), pygame.SRCALPHA)
-            factor = 0.6 + (i * 0.2)
-            pygame.draw.circle(explosion_surf, color, 
-                              (current_size, current_size), 
-                              int(current_size * factor))
-            surface.blit(explosion_surf, 
-                        (self.position[0] - current_size, self.position[1] - current_size))
+        image = explosion_frames.get(self.size, self.current_frame)
+        return surface.blit(image, (self.position[0] - image.get_width() // 2,
+                                    self.position[1] - image.get_height() // 2))
 
-class Star:
+class ParticleSprites:
     def __init__(self):
-        self.image = self.create_star_image()
+        self.tables = {}
+        
+    def table(self, surface):
+        surface_format = (surface.get_bitsize(), surface.get_masks())
+        table = self.tables.get(surface_format)
+        if table is None:
+            table = self.tables[surface_format] = self.render(surface)
+        return table
+        
+    def render(self, surface):
+        images = []
+        offsets = []
+        for color, radius in PARTICLE_KINDS.values():
+            for step in range(PARTICLE_FADE_STEPS):
+                fade = (step + 1) / PARTICLE_FADE_STEPS
+                image = pygame.Surface((radius * 2 + 1, radius * 2 + 1), 0, surface)
+                image.fill((0, 0, 0))
+                for ring in range(radius, 0, -1):
+                    intensity = fade * (radius - ring + 1) / radius
+                    pygame.draw.circle(image, [int(c * intensity) for c in color], (radius, radius), ring)
+                images.append(image)
+                offsets.append(radius)
+        if np is not None:
+            offsets = np.array(offsets, dtype=np.intp)
+        return images, offsets
+        
+    def clear(self):
+        self.tables.clear()
+
+particle_sprites = ParticleSprites()
+
+def emissions(name, scale):
+    for kind, count, min_speed, max_speed, min_life, max_life, angle, spread in PARTICLE_EMITTERS[name]:
+        count = round(count * scale * quality.settings.particles)
+        if count > 0:
+            yield (PARTICLE_KIND_INDEX[kind], count, (min_speed, max_speed), (min_life, max_life),
+                   (angle - spread, angle + spread))
+
+class ParticleList:
+    def __init__(self, seed=0, limit=PARTICLE_LIMIT):
+        self.rng = random.Random(seed)
+        self.limit = limit
+        self.particles = []
+        
+    def __len__(self):
+        return len(self.particles)
+        
+    def emit(self, name, x, y, scale=1.0):
+        rng = self.rng
+        for kind, count, speeds, lives, angles in emissions(name, scale):
+            for _ in range(min(count, self.limit - len(self.particles))):
+                angle = rng.uniform(*angles)
+                speed = rng.uniform(*speeds)
+                life = rng.randint(*lives)
+                self.particles.append([x, y, math.cos(angle) * speed, math.sin(angle) * speed, life, life, kind])
+                
+    def update(self):
+        for particle in self.particles:
+            particle[0] += particle[2]
+            particle[1] += particle[3]
+            particle[2] *= PARTICLE_DRAG
+            particle[3] *= PARTICLE_DRAG
+            particle[4] -= 1
+        self.particles = [particle for particle in self.particles if particle[4] > 0]
+        
+    def clear(self):
+        self.particles = []
+        
+    def snapshot(self, field=None):
+        if field is None:
+            field = copy.copy(self)
+            field.particles = []
+        copies = field.particles
+        field.__dict__.update(self.__dict__)
+        del copies[len(self.particles):]
+        for copied, particle in zip(copies, self.particles):
+            copied[:] = particle
+        copies.extend(list(particle) for particle in self.particles[len(copies):])
+        field.particles = copies
+        return field
+        
+    def draw(self, surface, alpha=1.0):
+        if not self.particles:
+            return []
+        images, offsets = particle_sprites.table(surface)
+        back = alpha - 1
+        blits = []
+        for x, y, vx, vy, life, lifetime, kind in self.particles:
+            index = kind * PARTICLE_FADE_STEPS + (life * PARTICLE_FADE_STEPS - 1) // lifetime
+            offset = offsets[index]
+            blits.append((images[index], (int(x + vx * back) - offset, int(y + vy * back) - offset),
+                          None, pygame.BLEND_ADD))
+        drawn = surface.blits(blits)
+        return [drawn[0].unionall(drawn)]
+
+class ParticleSystem:
+    fields = ("x", "y", "vx", "vy", "life", "lifetime", "kind")
+    
+    def __init__(self, seed=0, limit=PARTICLE_LIMIT):
+        self.generator = np.random.default_rng(seed)
+        self.limit = limit
+        self.count = 0
+        self.x = np.zeros(limit, np.float32)
+        self.y = np.zeros(limit, np.float32)
+        self.vx = np.zeros(limit, np.float32)
+        self.vy = np.zeros(limit, np.float32)
+        self.life = np.zeros(limit, np.int16)
+        self.lifetime = np.zeros(limit, np.int16)
+        self.kind = np.zeros(limit, np.uint8)
+        
+    def __len__(self):
+        return self.count
+        
+    def emit(self, name, x, y, scale=1.0):
+        generator = self.generator
+        for kind, count, speeds, lives, angles in emissions(name, scale):
+            count = min(count, self.limit - self.count)
+            if count <= 0:
+                return
+            new = slice(self.count, self.count + count)
+            angle = generator.uniform(*angles, count)
+            speed = generator.uniform(*speeds, count)
+            self.x[new] = x
+            self.y[new] = y
+            self.vx[new] = np.cos(angle) * speed
+            self.vy[new] = np.sin(angle) * speed
+            self.life[new] = self.lifetime[new] = generator.integers(*lives, count, endpoint=True)
+            self.kind[new] = kind
+            self.count += count
+            
+    def update(self):
+        count = self.count
+        if not count:
+            return
+        vx = self.vx[:count]
+        vy = self.vy[:count]
+        life = self.life[:count]
+        self.x[:count] += vx
+        self.y[:count] += vy
+        vx *= PARTICLE_DRAG
+        vy *= PARTICLE_DRAG
+        life -= 1
+        alive = np.flatnonzero(life > 0)
+        if len(alive) < count:
+            for name in self.fields:
+                values = getattr(self, name)
+                values[:len(alive)] = values[alive]
+            self.count = len(alive)
+            
+    def clear(self):
+        self.count = 0
+        
+    def snapshot(self, field=None):
+        if field is None or field.limit != self.limit:
+            field = copy.copy(self)
+            for name in self.fields:
+                setattr(field, name, getattr(self, name).copy())
+            return field
+        arrays = [getattr(field, name) for name in self.fields]
+        field.__dict__.update(self.__dict__)
+        for name, values in zip(self.fields, arrays):
+            values[:self.count] = getattr(self, name)[:self.count]
+            setattr(field, name, values)
+        return field
+        
+    def draw(self, surface, alpha=1.0):
+        count = self.count
+        if not count:
+            return []
+        images, offsets = particle_sprites.table(surface)
+        index = (self.kind[:count].astype(np.intp) * PARTICLE_FADE_STEPS
+                 + (self.life[:count].astype(np.intp) * PARTICLE_FADE_STEPS - 1) // self.lifetime[:count])
+        offset = offsets[index]
+        back = alpha - 1
+        xs = (self.x[:count] + self.vx[:count] * back).astype(np.intp) - offset
+        ys = (self.y[:count] + self.vy[:count] * back).astype(np.intp) - offset
+        surface.blits(zip(map(images.__getitem__, index.tolist()), zip(xs.tolist(), ys.tolist()),
+                          itertools.repeat(None), itertools.repeat(pygame.BLEND_ADD)), False)
+        left = int(xs.min())
+        top = int(ys.min())
+        size = 2 * int(offset.max()) + 1
+        return [pygame.Rect(left, top, int(xs.max()) - left + size, int(ys.max()) - top + size)]
+
+def create_particle_system(seed=0):
+    if np is not None:
+        return ParticleSystem(seed)
+    return ParticleList(seed)
+
+class Star:
+    def __init__(self, rng=random):
+        self.image = sprites.get("star", self.create_star_image)
         self.rect = self.image.get_rect()
-        self.rect.x = random.randint(0, SCREEN_WIDTH - STAR_SIZE)
+        self.rect.x = rng.randint(0, SCREEN_WIDTH - STAR_SIZE)
         self.rect.y = -STAR_SIZE
+        self.prev_pos = self.rect.topleft
         self.speed = STAR_SPEED
         
     def create_star_image(self):
@@ -303,52 +1125,270 @@ class Star:
         return final_image
         
     def update(self):
+        self.prev_pos = self.rect.topleft
         self.rect.y += self.speed
         return self.rect.top > SCREEN_HEIGHT
         
+    def collision_mask(self):
+        return sprites.mask("star"), self.rect.topleft
+        
     def draw(self, surface):
-        surface.blit(self.image, self.rect)
+        return surface.blit(self.image, self.rect)
 
 class StarField:
-    def __init__(self):
+    def __init__(self, num_stars=STAR_FIELD_COUNT, rng=random, seed=None):
         self.stars = []
-        self.num_stars = 100
+        self.num_stars = num_stars
+        self.seed = rng.getrandbits(64) if seed is None else seed
+        self.rng = random.Random(self.seed)
+        self.updates = 0
         self.initialize_stars()
         
     def initialize_stars(self):
         for _ in range(self.num_stars):
             self.stars.append({
-                'x': random.randint(0, SCREEN_WIDTH),
-                'y': random.randint(0, SCREEN_HEIGHT),
-                'speed': random.uniform(0.5, 2.0),
-                'size': random.randint(1, 3),
-                'brightness': random.randint(100, 255)
+                'x': self.rng.randint(0, SCREEN_WIDTH),
+                'y': self.rng.randint(0, SCREEN_HEIGHT),
+                'speed': round(self.rng.uniform(0.5, 2.0) * STAR_FIELD_SUBPIXELS) / STAR_FIELD_SUBPIXELS,
+                'size': self.rng.randint(1, 3),
+                'brightness': self.rng.randint(100, 255)
             })
     
     def update(self):
+        self.updates += 1
         for star in self.stars:
             star['y'] += star['speed']
             if star['y'] > SCREEN_HEIGHT:
                 star['y'] = 0
-                star['x'] = random.randint(0, SCREEN_WIDTH)
+                star['x'] = self.rng.randint(0, SCREEN_WIDTH)
     
+    def snapshot(self, field=None):
+        if field is None or len(field.stars) != len(self.stars):
+            field = copy.copy(self)
+            field.stars = [dict(star) for star in self.stars]
+            return field
+        copies = field.stars
+        field.__dict__.update(self.__dict__)
+        for copied, star in zip(copies, self.stars):
+            copied.update(star)
+        field.stars = copies
+        return field
+        
+    def pack_state(self):
+        version, internal, gauss = self.rng.getstate()
+        return REWIND_STAR_LIST.pack(len(self.stars), self.seed, self.updates) + REWIND_RANDOM.pack(*internal) + \
+            b"".join(REWIND_STAR.pack(star['x'], star['y'], star['speed'], star['size'], star['brightness'])
+                     for star in self.stars)
+        
+    def unpack_state(self, data, offset):
+        count, self.seed, self.updates = REWIND_STAR_LIST.unpack_from(data, offset)
+        offset += REWIND_STAR_LIST.size
+        self.rng.setstate((3, REWIND_RANDOM.unpack_from(data, offset), None))
+        offset += REWIND_RANDOM.size
+        end = offset + count * REWIND_STAR.size
+        self.stars = [{'x': x, 'y': y, 'speed': speed, 'size': size, 'brightness': brightness}
+                      for x, y, speed, size, brightness in REWIND_STAR.iter_unpack(data[offset:end])]
+        self.num_stars = count
+        return end
+        
+    def pack_undo(self, previous):
+        count, seed, updates = REWIND_STAR_LIST.unpack_from(previous)
+        moved = self.updates - updates
+        wrapped = [index for index, star in enumerate(self.stars) if star['y'] == 0] if moved else []
+        header = REWIND_STAR_UNDO.pack(REWIND_UNDO_DELTA, moved, len(wrapped))
+        if not wrapped:
+            return header
+        rows = REWIND_STAR_LIST.size + REWIND_RANDOM.size
+        old = [REWIND_STAR.unpack_from(previous, rows + index * REWIND_STAR.size) for index in wrapped]
+        return b"".join((header, previous[REWIND_STAR_LIST.size:rows], struct.pack(f"<{len(wrapped)}I", *wrapped),
+                         struct.pack(f"<{len(old)}h", *[x for x, *_ in old]),
+                         struct.pack(f"<{len(old)}d", *[y for _, y, *_ in old])))
+        
+    def unpack_undo(self, data, offset):
+        kind, moved, count = REWIND_STAR_UNDO.unpack_from(data, offset)
+        offset += REWIND_STAR_UNDO.size
+        if moved:
+            self.updates -= 1
+            for star in self.stars:
+                star['y'] -= star['speed']
+        if count:
+            self.rng.setstate((3, REWIND_RANDOM.unpack_from(data, offset), None))
+            offset += REWIND_RANDOM.size
+            wrapped = struct.unpack_from(f"<{count}I", data, offset)
+            xs = struct.unpack_from(f"<{count}h", data, offset + count * 4)
+            ys = struct.unpack_from(f"<{count}d", data, offset + count * 6)
+            for index, x, y in zip(wrapped, xs, ys):
+                self.stars[index]['x'] = x
+                self.stars[index]['y'] = y
+            offset += count * 14
+        return offset
+        
     def draw(self, surface):
-        for star in self.stars:
+        drawn = []
+        for star in self.stars[::quality.settings.star_stride]:
             brightness = star['brightness']
-            pygame.draw.circle(surface, (brightness, brightness, brightness), 
-                             (int(star['x']), int(star['y'])), 
-                             star['size'])
+            drawn.append(pygame.draw.circle(surface, (brightness, brightness, brightness), 
+                                            (int(star['x']), int(star['y'])), 
+                                            star['size']))
+        return drawn
+
+class ArrayStarField:
+    def __init__(self, num_stars=STAR_FIELD_COUNT, rng=random, seed=None):
+        self.num_stars = num_stars
+        self.seed = rng.getrandbits(64) if seed is None else seed
+        self.generator = np.random.default_rng(self.seed)
+        self.updates = 0
+        self.size = np.sort(self.generator.integers(1, 3, num_stars, endpoint=True))
+        self.x = self.generator.integers(0, SCREEN_WIDTH, num_stars, endpoint=True)
+        self.y = self.generator.integers(0, SCREEN_HEIGHT, num_stars, endpoint=True).astype(np.float64)
+        self.speed = np.round(self.generator.uniform(0.5, 2.0, num_stars) * STAR_FIELD_SUBPIXELS) / STAR_FIELD_SUBPIXELS
+        self.brightness = self.generator.integers(100, 255, num_stars, endpoint=True)
+        self.stamps = []
+        for radius in (1, 2, 3):
+            first, last = np.searchsorted(self.size, [radius, radius + 1])
+            self.stamps.append((slice(first, last), self.circle_offsets(radius)))
+        self.palettes = {}
+        
+    def circle_offsets(self, radius):
+        center = radius + 1
+        stamp = pygame.Surface((center * 2 + 1, center * 2 + 1))
+        pygame.draw.circle(stamp, (255, 255, 255), (center, center), radius)
+        dx, dy = np.nonzero(pygame.surfarray.array2d(stamp))
+        return dx - center, dy - center
+        
+    def update(self):
+        self.updates += 1
+        self.y += self.speed
+        wrapped = self.y > SCREEN_HEIGHT
+        count = np.count_nonzero(wrapped)
+        if count:
+            self.y[wrapped] = 0
+            self.x[wrapped] = self.generator.integers(0, SCREEN_WIDTH, count, endpoint=True)
+            
+    def colors_for(self, surface):
+        surface_format = (surface.get_bitsize(), surface.get_masks())
+        palette = self.palettes.get(surface_format)
+        if palette is None:
+            palette = self.palettes[surface_format] = np.array([surface.map_rgb((v, v, v)) for v in range(256)],
+                                                                dtype=np.int64)
+        return palette[self.brightness]
+        
+    def snapshot(self, field=None):
+        if field is None or field.x.shape != self.x.shape:
+            field = copy.copy(self)
+            field.x = self.x.copy()
+            field.y = self.y.copy()
+            return field
+        x, y = field.x, field.y
+        field.__dict__.update(self.__dict__)
+        x[:] = self.x
+        y[:] = self.y
+        field.x, field.y = x, y
+        return field
+        
+    def pack_state(self):
+        bits = self.generator.bit_generator.state
+        header = REWIND_STAR_FIELD.pack(self.num_stars, self.seed, self.updates,
+                                        bits["state"]["state"].to_bytes(16, "little"),
+                                        bits["state"]["inc"].to_bytes(16, "little"), bits["has_uint32"],
+                                        bits["uinteger"])
+        return header + self.x.astype(np.int16).tobytes() + self.y.tobytes()
+        
+    def restore_generator(self, data, offset):
+        num_stars, seed, updates, state, inc, has_uint32, uinteger = REWIND_STAR_FIELD.unpack_from(data, offset)
+        self.generator.bit_generator.state = {
+            "bit_generator": "PCG64",
+            "state": {"state": int.from_bytes(state, "little"), "inc": int.from_bytes(inc, "little")},
+            "has_uint32": has_uint32,
+            "uinteger": uinteger,
+        }
+        
+    def unpack_state(self, data, offset):
+        num_stars, seed, updates = REWIND_STAR_FIELD.unpack_from(data, offset)[:3]
+        if seed != self.seed or num_stars != self.num_stars:
+            self.__init__(num_stars, seed=seed)
+        self.restore_generator(data, offset)
+        self.updates = updates
+        offset += REWIND_STAR_FIELD.size
+        self.x[:] = np.frombuffer(data, np.int16, num_stars, offset)
+        offset += num_stars * 2
+        self.y[:] = np.frombuffer(data, np.float64, num_stars, offset)
+        return offset + num_stars * 8
+        
+    def pack_undo(self, previous):
+        num_stars, seed, updates = REWIND_STAR_FIELD.unpack_from(previous)[:3]
+        moved = self.updates - updates
+        wrapped = np.flatnonzero(self.y == 0).astype(np.uint32) if moved else ()
+        header = REWIND_STAR_UNDO.pack(REWIND_UNDO_DELTA, moved, len(wrapped))
+        if not len(wrapped):
+            return header
+        x = np.frombuffer(previous, np.int16, num_stars, REWIND_STAR_FIELD.size)[wrapped]
+        y = np.frombuffer(previous, np.float64, num_stars, REWIND_STAR_FIELD.size + num_stars * 2)[wrapped]
+        return b"".join((header, previous[:REWIND_STAR_FIELD.size], wrapped.tobytes(), x.tobytes(), y.tobytes()))
+        
+    def unpack_undo(self, data, offset):
+        kind, moved, count = REWIND_STAR_UNDO.unpack_from(data, offset)
+        offset += REWIND_STAR_UNDO.size
+        if moved:
+            self.updates -= 1
+            self.y -= self.speed
+        if count:
+            self.restore_generator(data, offset)
+            offset += REWIND_STAR_FIELD.size
+            wrapped = np.frombuffer(data, np.uint32, count, offset)
+            self.x[wrapped] = np.frombuffer(data, np.int16, count, offset + count * 4)
+            self.y[wrapped] = np.frombuffer(data, np.float64, count, offset + count * 6)
+            offset += count * 14
+        return offset
+        
+    def draw(self, surface):
+        if surface.get_bytesize() == 3:
+            return self.draw_circles(surface)
+            
+        width, height = surface.get_size()
+        stride = quality.settings.star_stride
+        colors = self.colors_for(surface)
+        pixels = pygame.surfarray.pixels2d(surface)
+        y = self.y.astype(np.intp)
+        for group, (dx, dy) in self.stamps:
+            group = slice(group.start, group.stop, stride)
+            xs = self.x[group, None] + dx
+            ys = y[group, None] + dy
+            visible = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+            pixels[xs[visible], ys[visible]] = np.broadcast_to(colors[group, None], xs.shape)[visible]
+        del pixels
+        return self.bounds(surface, y)
+        
+    def bounds(self, surface, rows):
+        if self.num_stars > DIRTY_RECT_LIMIT:
+            return [surface.get_rect()]
+        return [pygame.Rect(x - size, y - size, size * 2 + 1, size * 2 + 1)
+                for x, y, size in zip(self.x.tolist(), rows.tolist(), self.size.tolist())]
+        
+    def draw_circles(self, surface):
+        stride = quality.settings.star_stride
+        return [pygame.draw.circle(surface, (brightness, brightness, brightness), (int(x), int(y)), int(size))
+                for x, y, size, brightness in zip(self.x[::stride], self.y[::stride], self.size[::stride],
+                                                  self.brightness[::stride])]
+
+def create_star_field(num_stars=STAR_FIELD_COUNT, rng=random):
+    if np is not None:
+        return ArrayStarField(num_stars, rng)
+    return StarField(num_stars, rng)
 
 class PowerStar:
-    def __init__(self):
+    pulse_step = 0.1
+    
+    def __init__(self, rng=random):
         self.size = STAR_SIZE
-        self.image = self.create_power_star_image()
+        self.image = sprites.get("power star", self.create_power_star_image)
         self.rect = self.image.get_rect()
-        self.rect.x = random.randint(0, SCREEN_WIDTH - self.size)
+        self.rect.x = rng.randint(0, SCREEN_WIDTH - self.size)
         self.rect.y = -self.size
+        self.prev_pos = self.rect.topleft
         self.speed = STAR_SPEED - 1
-        self.glow_factor = 0
-        self.glow_direction = 1
+        self.pulse = 0
+        self.pulse_dir = 1
         
     def create_power_star_image(self):
         base_image = pygame.Surface((self.size + 10, self.size + 10), pygame.SRCALPHA)
@@ -380,39 +1420,44 @@ class PowerStar:
         return base_image
         
     def update(self):
+        self.prev_pos = self.rect.topleft
         self.rect.y += self.speed
         
-        self.glow_factor += 0.1 * self.glow_direction
-        if self.glow_factor >= 1.0:
-            self.glow_direction = -1
-        elif self.glow_factor <= 0.0:
-            self.glow_direction = 1
+        self.pulse += self.pulse_step * self.pulse_dir
+        if self.pulse >= 1.0:
+            self.pulse_dir = -1
+        elif self.pulse <= 0.0:
+            self.pulse_dir = 1
             
         return self.rect.top > SCREEN_HEIGHT
         
+    def collision_mask(self):
+        return sprites.mask("power star"), self.rect.topleft
+        
     def draw(self, surface):
-        glow_size = int(self.size + 20 * self.glow_factor)
-        glow_surf = pygame.Surface((glow_size, glow_size), pygame.SRCALPHA)
+        if not quality.settings.glow:
+            return surface.blit(self.image, self.rect)
+        glow_size = int(self.size + 20 * self.pulse)
         glow_color = (200, 200, 255, 100)
-        
-        pygame.draw.circle(glow_surf, glow_color, 
-                          (glow_size // 2, glow_size // 2), 
-                          glow_size // 2)
+        glow_surf = effects.glow(glow_size, glow_color)
         
         glow_x = self.rect.centerx - glow_size // 2
         glow_y = self.rect.centery - glow_size // 2
-        surface.blit(glow_surf, (glow_x, glow_y))
-        surface.blit(self.image, self.rect)
+        glow_rect = surface.blit(glow_surf, (glow_x, glow_y))
+        return glow_rect.union(surface.blit(self.image, self.rect))
 
 class Heart:
+    pulse_step = 0.05
+    
     def __init__(self, x, y):
         self.size = 20
-        self.image = self.create_heart_image()
+        self.image = sprites.get("heart", self.create_heart_image)
         self.rect = self.image.get_rect()
         self.rect.x = x - self.rect.width // 2
         self.rect.y = y
+        self.prev_pos = self.rect.topleft
         self.speed = 2
-        self.pulse_value = 0
+        self.pulse = 0
         self.pulse_dir = 1
         
     def create_heart_image(self):
@@ -436,39 +1481,43 @@ class Heart:
         return image
         
     def update(self):
+        self.prev_pos = self.rect.topleft
         self.rect.y += self.speed
         
-        self.pulse_value += 0.05 * self.pulse_dir
-        if self.pulse_value >= 1.0:
+        self.pulse += self.pulse_step * self.pulse_dir
+        if self.pulse >= 1.0:
             self.pulse_dir = -1
-        elif self.pulse_value <= 0.0:
+        elif self.pulse <= 0.0:
             self.pulse_dir = 1
             
         return self.rect.top > SCREEN_HEIGHT
         
+    def collision_mask(self):
+        return sprites.mask("heart"), self.rect.topleft
+        
     def draw(self, surface):
-        pulse_size = int(self.size * (1.2 + 0.2 * self.pulse_value))
-        glow_surf = pygame.Surface((pulse_size, pulse_size), pygame.SRCALPHA)
+        if not quality.settings.glow:
+            return surface.blit(self.image, self.rect)
+        pulse_size = int(self.size * (1.2 + 0.2 * self.pulse))
         glow_color = (255, 100, 100, 100)
-        
-        pygame.draw.circle(glow_surf, glow_color, 
-                          (pulse_size // 2, pulse_size // 2), 
-                          pulse_size // 2)
+        glow_surf = effects.glow(pulse_size, glow_color)
         
         glow_x = self.rect.centerx - pulse_size // 2
         glow_y = self.rect.centery - pulse_size // 2
-        surface.blit(glow_surf, (glow_x, glow_y))
-        surface.blit(self.image, self.rect)
+        glow_rect = surface.blit(glow_surf, (glow_x, glow_y))
+        return glow_rect.union(surface.blit(self.image, self.rect))
 
 class AlienBoss:
-    def __init__(self):
+    def __init__(self, health=15):
         self.size = 100
-        self.image = self.create_alien_image()
+        self.image = sprites.get("alien boss", self.create_alien_image)
         self.rect = self.image.get_rect()
         self.rect.centerx = SCREEN_WIDTH // 2
         self.rect.y = 50
+        self.prev_pos = self.rect.topleft
         self.speed = 4
-        self.health = 15
+        self.health = health
+        self.max_health = health
         self.direction = 1
         self.shoot_cooldown = 0
         self.shoot_delay = 25
@@ -530,6 +1579,7 @@ class AlienBoss:
         return image
         
     def update(self):
+        self.prev_pos = self.rect.topleft
         self.rect.x += self.speed * self.direction
         
         if self.rect.right >= SCREEN_WIDTH or self.rect.left <= 0:
@@ -548,71 +1598,488 @@ class AlienBoss:
             missile_right_x = self.rect.left + self.size * 3 // 4 - MISSILE_SIZE // 2
             missile_y = self.rect.bottom - 10
             
-            missiles.append(AlienMissile(missile_left_x, missile_y))
-            missiles.append(AlienMissile(missile_right_x, missile_y))
+            missiles.append(spawn(AlienMissile, missile_left_x, missile_y))
+            missiles.append(spawn(AlienMissile, missile_right_x, missile_y))
             return missiles
         return None
         
+    def collision_mask(self):
+        return sprites.mask("alien boss"), self.rect.topleft
+        
     def draw(self, surface):
-        if self.energy_pulse < 10:
+        drawn = []
+        if self.energy_pulse < 10 and quality.settings.glow:
             field_size = self.size + 10 + self.energy_pulse
-            field_surf = pygame.Surface((field_size, field_size), pygame.SRCALPHA)
             field_color = (100, 0, 0, 100 - self.energy_pulse * 10)
-            pygame.draw.circle(field_surf, field_color, 
-                             (field_size // 2, field_size // 2), 
-                             field_size // 2)
-            surface.blit(field_surf, 
-                       (self.rect.centerx - field_size // 2, 
-                        self.rect.centery - field_size // 2))
-        
-        surface.blit(self.image, self.rect)
-        
-        health_width = self.size * (self.health / 15)
-        pygame.draw.rect(surface, (100, 0, 0), 
-                        pygame.Rect(self.rect.x, self.rect.y - 10, self.size, 5))
+            field_surf = effects.glow(field_size, field_color)
+            drawn.append(surface.blit(field_surf, 
+                                      (self.rect.centerx - field_size // 2, 
+                                       self.rect.centery - field_size // 2)))
+        
+        image_rect = surface.blit(self.image, self.rect)
+        
+        health_width = self.size * (self.health / self.max_health)
+        drawn.append(pygame.draw.rect(surface, (100, 0, 0), 
+                                      pygame.Rect(self.rect.x, self.rect.y - 10, self.size, 5)))
         pygame.draw.rect(surface, (255, 0, 0), 
                         pygame.Rect(self.rect.x, self.rect.y - 10, health_width, 5))
+        return image_rect.unionall(drawn)
         
 class AlienMissile:
     def __init__(self, x, y):
         self.rect = pygame.Rect(x, y, MISSILE_SIZE, MISSILE_SIZE * 1.5)
+        self.prev_pos = (x, y)
         self.speed = MISSILE_SPEED - 2
         
+    def reset(self, x, y):
+        self.rect.topleft = (x, y)
+        self.prev_pos = (x, y)
+        
     def update(self):
+        self.prev_pos = self.rect.topleft
         self.rect.y += self.speed
         return self.rect.top > SCREEN_HEIGHT
         
+    def collision_mask(self):
+        return sprites.rect_mask(self.rect.size), self.rect.topleft
+        
     def draw(self, surface):
-        pygame.draw.rect(surface, (50, 255, 50), self.rect)
+        body_rect = pygame.draw.rect(surface, (50, 255, 50), self.rect)
         
-        pygame.draw.polygon(surface, (150, 255, 150), [
+        tip_rect = pygame.draw.polygon(surface, (150, 255, 150), [
             (self.rect.left, self.rect.bottom - MISSILE_SIZE * 0.5),
             (self.rect.centerx, self.rect.bottom),
             (self.rect.right, self.rect.bottom - MISSILE_SIZE * 0.5)
         ])
         
         trail_color = (100, 255, 100, 128)
-        trail_surface = pygame.Surface((MISSILE_SIZE, MISSILE_SIZE), pygame.SRCALPHA)
-        pygame.draw.polygon(trail_surface, trail_color, [
+        trail_surface = effects.trail((MISSILE_SIZE, MISSILE_SIZE), trail_color, (
             (0, MISSILE_SIZE),
             (MISSILE_SIZE // 2, 0),
             (MISSILE_SIZE, MISSILE_SIZE)
-        ])
-        surface.blit(trail_surface, (self.rect.left, self.rect.top - MISSILE_SIZE))
+        ))
+        trail_rect = surface.blit(trail_surface, (self.rect.left, self.rect.top - MISSILE_SIZE))
+        return body_rect.unionall((tip_rect, trail_rect))
+
+def warm_sprites():
+    Player()
+    AlienBoss()
+    Star()
+    PowerStar()
+    Heart(0, 0)
+    for variant in range(ASTEROID_VARIANTS):
+        sprites.asteroid(variant)
+
+class EntityPool:
+    def __init__(self, factory):
+        self.factory = factory
+        self.free = []
+        self.created = 0
+        self.reused = 0
+        
+    def acquire(self, *args):
+        if self.free:
+            entity = self.free.pop()
+            entity.reset(*args)
+            self.reused += 1
+            return entity
+        self.created += 1
+        return self.factory(*args)
+        
+    def release(self, entity):
+        self.free.append(entity)
+
+pools = {cls: EntityPool(cls) for cls in (Missile, PowerMissile, AlienMissile, Asteroid, Explosion)}
+
+def spawn(cls, *args):
+    return pools[cls].acquire(*args)
+
+def reclaim(cls):
+    pool = pools.get(cls)
+    if pool is not None and pool.free:
+        pool.reused += 1
+        return pool.free.pop()
+    return object.__new__(cls)
+
+def recycle(entity):
+    pool = pools.get(type(entity))
+    if pool is not None:
+        pool.release(entity)
+
+def sweep(entities):
+    kept = 0
+    for entity in entities:
+        if entity.update():
+            recycle(entity)
+        else:
+            entities[kept] = entity
+            kept += 1
+    del entities[kept:]
+
+def discard(entities, dead):
+    if not dead:
+        return
+    kept = 0
+    for entity in entities:
+        if entity in dead:
+            recycle(entity)
+        else:
+            entities[kept] = entity
+            kept += 1
+    del entities[kept:]
+
+class EntityList(list):
+    def sweep(self):
+        sweep(self)
+        
+    def discard(self, dead):
+        discard(self, dead)
+        
+    def sync(self):
+        pass
+        
+    def replace(self, entities, columns=None):
+        self[:] = entities
+
+RISING_ENTITIES = (Missile, PowerMissile)
+ENTITY_STORE_FIELDS = {
+    "x": "i8", "y": "i8", "width": "i8", "height": "i8", "prev_x": "i8", "prev_y": "i8", "vy": "i8",
+    "rotation": "f8", "spin": "f8", "pulse": "f8", "pulse_step": "f8", "pulse_dir": "i8",
+}
+
+class EntityStore:
+    def __init__(self, capacity=ENTITY_STORE_DENSE):
+        self.entities = []
+        self.dense = False
+        self.dense_at = ENTITY_STORE_DENSE
+        self.capacity = capacity
+        for name, dtype in ENTITY_STORE_FIELDS.items():
+            setattr(self, name, np.zeros(capacity, dtype))
+            
+    def __len__(self):
+        return len(self.entities)
+        
+    def __iter__(self):
+        return iter(self.entities)
+        
+    def __getitem__(self, index):
+        return self.entities[index]
+        
+    def append(self, entity):
+        if self.dense:
+            self.store(len(self.entities), entity)
+        self.entities.append(entity)
+        
+    def extend(self, entities):
+        for entity in entities:
+            self.append(entity)
+            
+    def reserve(self, count):
+        if count <= self.capacity:
+            return
+        while self.capacity < count:
+            self.capacity *= 2
+        for name in ENTITY_STORE_FIELDS:
+            column = getattr(self, name)
+            grown = np.zeros(self.capacity, column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+            
+    def store(self, row, entity):
+        self.reserve(row + 1)
+        rect = entity.rect
+        self.x[row], self.y[row], self.width[row], self.height[row] = rect
+        self.prev_x[row], self.prev_y[row] = entity.prev_pos
+        self.vy[row] = -entity.speed if isinstance(entity, RISING_ENTITIES) else entity.speed
+        self.rotation[row] = getattr(entity, "rotation", 0.0)
+        self.spin[row] = getattr(entity, "rotation_speed", 0.0)
+        self.pulse[row] = getattr(entity, "pulse", 0.0)
+        self.pulse_step[row] = getattr(entity, "pulse_step", 0.0)
+        self.pulse_dir[row] = getattr(entity, "pulse_dir", 1)
+        
+    def compact(self, keep):
+        count = len(self.entities)
+        kept = int(np.count_nonzero(keep))
+        for name in ENTITY_STORE_FIELDS:
+            column = getattr(self, name)
+            column[:kept] = column[:count][keep]
+        self.entities = list(itertools.compress(self.entities, keep.tolist()))
+        
+    def sweep(self):
+        if not self.dense:
+            sweep(self.entities)
+            if len(self.entities) >= self.dense_at:
+                for row, entity in enumerate(self.entities):
+                    self.store(row, entity)
+                self.dense = True
+            return
+            
+        count = len(self.entities)
+        y = self.y[:count]
+        self.prev_x[:count] = self.x[:count]
+        self.prev_y[:count] = y
+        vy = self.vy[:count]
+        y += vy
+        
+        rotation = self.rotation[:count]
+        rotation += self.spin[:count]
+        rotation[rotation >= 360] -= 360
+        rotation[rotation < 0] += 360
+        
+        pulse = self.pulse[:count]
+        pulse_dir = self.pulse_dir[:count]
+        pulse += self.pulse_step[:count] * pulse_dir
+        pulse_dir[pulse >= 1.0] = -1
+        pulse_dir[pulse <= 0.0] = 1
+        
+        culled = np.where(vy < 0, y + self.height[:count] < 0, y > SCREEN_HEIGHT)
+        if culled.any():
+            for entity in itertools.compress(self.entities, culled.tolist()):
+                recycle(entity)
+            self.compact(~culled)
+            count = len(self.entities)
+            
+        if self.spin[:count].any():
+            for entity, top, rotation in zip(self.entities, self.y[:count].tolist(),
+                                             self.rotation[:count].tolist()):
+                entity.rect.y = top
+                entity.rotation = rotation
+        else:
+            for entity, top in zip(self.entities, self.y[:count].tolist()):
+                entity.rect.y = top
+            
+        if count < self.dense_at // 2:
+            self.sync()
+            self.dense = False
+            
+    def discard(self, dead):
+        if not dead:
+            return
+        if not self.dense:
+            discard(self.entities, dead)
+            return
+        keep = np.fromiter((entity not in dead for entity in self.entities), dtype=bool, count=len(self.entities))
+        for entity in itertools.compress(self.entities, (~keep).tolist()):
+            recycle(entity)
+        self.compact(keep)
+        
+    def replace(self, entities, columns=None):
+        count = len(entities)
+        self.entities = entities
+        self.dense = count >= self.dense_at or (self.dense and count >= self.dense_at // 2)
+        if not self.dense or columns is None:
+            self.dense = False
+            return
+        self.reserve(count)
+        values = columns()
+        for name in ENTITY_STORE_FIELDS:
+            getattr(self, name)[:count] = values[name]
+        
+    def sync(self):
+        if not self.dense:
+            return
+        count = len(self.entities)
+        positions = zip(self.prev_x[:count].tolist(), self.prev_y[:count].tolist())
+        for entity, prev_pos in zip(self.entities, positions):
+            entity.prev_pos = prev_pos
+        for row in np.flatnonzero(self.pulse_step[:count]).tolist():
+            self.entities[row].pulse = float(self.pulse[row])
+            self.entities[row].pulse_dir = int(self.pulse_dir[row])
+            
+    def rect_array(self):
+        count = len(self.entities)
+        if not self.dense:
+            rects = itertools.chain.from_iterable(entity.rect for entity in self.entities)
+            return np.fromiter(rects, dtype=np.int64, count=count * 4).reshape(-1, 4)
+        return np.stack((self.x[:count], self.y[:count], self.width[:count], self.height[:count]), axis=1)
+
+def create_entity_group():
+    if np is not None:
+        return EntityStore()
+    return EntityList()
+
+class FrameProfiler:
+    def __init__(self, size=PROFILE_HISTORY):
+        self.size = size
+        self.phases = {}
+        self.counts = {}
+        self.current = {}
+        self.totals = array("d", bytes(8 * size))
+        self.index = 0
+        self.frames = 0
+        self.last = 0.0
+        self.text = None
+        self.lines = []
+        
+    def begin(self):
+        self.last = time.perf_counter()
+        
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.current[phase] = self.current.get(phase, 0.0) + now - self.last
+        self.last = now
+        
+    def end_frame(self, counts):
+        index = self.index
+        current = self.current
+        for phase in current:
+            if phase not in self.phases:
+                self.phases[phase] = array("d", bytes(8 * self.size))
+        for phase, timings in self.phases.items():
+            timings[index] = current.get(phase, 0.0)
+        for name, count in counts.items():
+            history = self.counts.get(name)
+            if history is None:
+                history = self.counts[name] = array("i", bytes(4 * self.size))
+            history[index] = count
+        self.totals[index] = sum(current.values())
+        current.clear()
+        self.frames += 1
+        self.index = (index + 1) % self.size
+            
+    def history(self, values):
+        if self.frames < self.size:
+            return list(values[:self.frames])
+        return list(values[self.index:]) + list(values[:self.index])
+        
+    def average(self, values, frames=PROFILE_AVERAGE):
+        recent = self.history(values)[-frames:]
+        return sum(recent) / max(len(recent), 1)
+        
+    def draw(self, surface, counts):
+        if self.text is None:
+            self.text = TextCache(default_font(20))
+        if self.frames % PROFILE_AVERAGE == 1 or not self.lines:
+            self.lines = [(name, f"{self.average(timings) * 1000:.2f} ms")
+                          for name, timings in self.phases.items()]
+            self.lines.append(("frame", f"{self.average(self.totals) * 1000:.2f} ms"))
+            self.lines.append(("quality", f"level {quality.level}" + (" (auto)" if quality.adaptive else "")))
+            self.lines.append(("entities", ""))
+            self.lines.extend((f"  {name}", str(count)) for name, count in counts.items())
+            
+        width = self.size + 20
+        line_height = 16
+        height = len(self.lines) * line_height + PROFILE_GRAPH_HEIGHT + 20
+        panel = pygame.Rect(10, SCREEN_HEIGHT - height - 10, width, height)
+        surface.fill((0, 0, 0), panel)
+        y = panel.top + 5
+        for name, value in self.lines:
+            label = self.text.render(name, (200, 200, 200))
+            text = self.text.render(value, (255, 255, 255))
+            surface.blit(label, (panel.left + 10, y))
+            surface.blit(text, (panel.right - 10 - text.get_width(), y))
+            y += line_height
+            
+        graph = pygame.Rect(panel.left + 10, panel.bottom - 10 - PROFILE_GRAPH_HEIGHT,
+                            self.size, PROFILE_GRAPH_HEIGHT)
+        budget = 1 / SIMULATION_RATE
+        scale = PROFILE_GRAPH_HEIGHT / (2 * budget)
+        pygame.draw.line(surface, (80, 80, 80), (graph.left, graph.bottom - budget * scale),
+                         (graph.right, graph.bottom - budget * scale))
+        totals = self.history(self.totals)
+        if len(totals) > 1:
+            points = [(graph.left + x, graph.bottom - min(total * scale, PROFILE_GRAPH_HEIGHT))
+                      for x, total in enumerate(totals)]
+            pygame.draw.lines(surface, (100, 255, 100), False, points)
+        return panel
+        
+    def export(self, path):
+        first = self.frames - min(self.frames, self.size)
+        frames = list(range(first, self.frames))
+        phases = {name: [t * 1000 for t in self.history(timings)] for name, timings in self.phases.items()}
+        phases["frame"] = [t * 1000 for t in self.history(self.totals)]
+        counts = {name: self.history(history) for name, history in self.counts.items()}
+        if path.endswith(".json"):
+            with open(path, "w") as f:
+                json.dump({"frame": frames, "ms": phases, "counts": counts}, f)
+            return
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["frame"] + [f"{name} ms" for name in phases] + list(counts))
+            columns = [frames] + list(phases.values()) + list(counts.values())
+            writer.writerows(zip(*columns))
+
+SNAPSHOT_GROUPS = ("missiles", "asteroids", "stars", "power_stars", "hearts", "explosions", "alien_missiles")
+
+def freeze(entity, clone=None):
+    if type(clone) is not type(entity):
+        clone = object.__new__(type(entity))
+    rect = clone.__dict__.get("rect")
+    clone.__dict__.clear()
+    clone.__dict__.update(entity.__dict__)
+    if "rect" in clone.__dict__:
+        if rect is None:
+            rect = entity.rect.copy()
+        else:
+            rect.update(entity.rect)
+        clone.rect = rect
+    return clone
+
+class Snapshot:
+    def __init__(self, game):
+        for name in SNAPSHOT_GROUPS:
+            setattr(self, name, [])
+        self.player = None
+        self.alien_boss = None
+        self.star_field = None
+        self.particles = None
+        self.capture(game)
+        
+    def capture(self, game):
+        self.frame = game.frame
+        for name in SNAPSHOT_GROUPS:
+            group = getattr(game, name)
+            group.sync()
+            clones = getattr(self, name)
+            clones.extend([None] * (len(group) - len(clones)))
+            clones[:] = [freeze(entity, clone) for entity, clone in zip(group, clones)]
+        self.player = freeze(game.player, self.player)
+        self.alien_boss = freeze(game.alien_boss, self.alien_boss) if game.alien_boss else None
+        self.star_field = game.star_field.snapshot(self.star_field)
+        self.particles = game.particles.snapshot(self.particles) if game.particles is not None else None
+        self.score = game.score
+        self.lives = game.lives
+        self.game_over = game.game_over
+        self.powered_up = game.powered_up
+        self.power_up_time = game.power_up_time
+        self.power_up_duration = game.power_up_duration
+        self.generation = game.generation
+        return self
 
 class Game:
-    def __init__(self):
+    def __init__(self, screen=None, collision="brute", dirty_rects=False, seed=None, pixel_collision=False):
+        self.screen = screen
+        self.collision = collision
+        self.dirty_rects = dirty_rects
+        self.pixel_collision = pixel_collision
+        self.collisions = COLLISION_BACKENDS[collision]()
+        self.seed = random.getrandbits(32) if seed is None else seed
+        self.rng = FrameRandom(self.seed)
+        self.frame = 0
+        self.profiler = None
+        self.rewind = None
+        self.font = default_font(36) if screen is not None else None
+        self.hud = TextCache(self.font) if screen is not None else None
+        self.previous_rects = None
+        self.drawn_generation = None
+        self.generation = 0
+        self.reset()
+        
+    def reset(self):
+        self.generation += 1
         self.player = Player()
-        self.missiles = []
-        self.asteroids = []
-        self.stars = []
-        self.power_stars = []
-        self.hearts = []
-        self.explosions = []
-        self.alien_missiles = []
+        self.missiles = create_entity_group()
+        self.asteroids = create_entity_group()
+        self.stars = create_entity_group()
+        self.power_stars = create_entity_group()
+        self.hearts = create_entity_group()
+        self.explosions = EntityList()
+        self.alien_missiles = create_entity_group()
         self.alien_boss = None
         self.boss_appears_at = 700
         self.boss_spawn_interval = 700
+        self.boss_health = 15
+        self.bosses_killed = 0
         self.score = 0
         self.lives = 5
         self.game_over = False
@@ -624,27 +2091,27 @@ class Game:
         self.powered_up = False
         self.power_up_time = 0
         self.power_up_duration = 30 * FPS
-        self.font = pygame.font.SysFont(None, 36)
-        self.star_field = StarField()
+        self.star_field = create_star_field(rng=self.rng)
+        self.particles = create_particle_system(self.seed & (2 ** 64 - 1)) if self.screen is not None else None
         
     def spawn_objects(self):
         self.asteroid_timer += 1
         if self.asteroid_timer >= self.asteroid_spawn_rate:
-            self.asteroids.append(Asteroid())
+            self.asteroids.append(spawn(Asteroid, self.rng))
             self.asteroid_timer = 0
             
         self.star_timer += 1
         if self.star_timer >= STAR_SPAWN_RATE:
-            self.stars.append(Star())
+            self.stars.append(Star(self.rng))
             self.star_timer = 0
             
         self.power_star_timer += 1
         if self.power_star_timer >= self.power_star_spawn_rate:
-            self.power_stars.append(PowerStar())
+            self.power_stars.append(PowerStar(self.rng))
             self.power_star_timer = 0
             
         if self.score >= self.boss_appears_at and self.alien_boss is None:
-            self.alien_boss = AlienBoss()
+            self.alien_boss = AlienBoss(self.boss_health)
             self.boss_appears_at += self.boss_spawn_interval
     
     def fire_power_missiles(self):
@@ -652,16 +2119,61 @@ class Game:
             self.player.cooldown = PLAYER_COOLDOWN
             missile_x = self.player.rect.centerx - MISSILE_SIZE // 2
             missile_y = self.player.rect.top
-            self.missiles.append(PowerMissile(missile_x, missile_y))
+            self.missiles.append(spawn(PowerMissile, missile_x, missile_y))
             
-    def update(self):
+    def touching(self, a, b):
+        if not a.rect.colliderect(b.rect):
+            return False
+        if not self.pixel_collision:
+            return True
+        mask_a, (ax, ay) = a.collision_mask()
+        mask_b, (bx, by) = b.collision_mask()
+        return mask_a.overlap(mask_b, (bx - ax, by - ay)) is not None
+        
+    def emit(self, name, position, scale=1.0):
+        if self.particles is not None:
+            self.particles.emit(name, position[0], position[1], scale)
+            
+    def hits(self, entity, group):
+        return [group[index] for index in entity.rect.collidelistall(group)
+                if self.touching(entity, group[index])]
+        
+    def player_hits(self, entities):
+        return self.hits(self.player, entities)
+        
+    def entity_counts(self):
+        return {
+            "missiles": len(self.missiles),
+            "asteroids": len(self.asteroids),
+            "stars": len(self.stars),
+            "power stars": len(self.power_stars),
+            "hearts": len(self.hearts),
+            "explosions": len(self.explosions),
+            "alien missiles": len(self.alien_missiles),
+            "particles": len(self.particles) if self.particles is not None else 0,
+        }
+        
+    def update(self, keys=None):
+        profiler = self.profiler
+        if profiler:
+            profiler.begin()
+        if keys is None:
+            keys = pygame.key.get_pressed()
+            
+        self.frame += 1
+        self.rng.begin_frame(self.frame)
+        if self.particles is not None:
+            self.particles.update()
         if self.game_over:
+            if keys[pygame.K_r]:
+                self.restart()
             return
             
         self.star_field.update()
-            
-        keys = pygame.key.get_pressed()
         self.player.update(keys)
+        player = self.player.rect
+        self.emit("exhaust", (player.left + PLAYER_SIZE * 0.3, player.bottom))
+        self.emit("exhaust", (player.left + PLAYER_SIZE * 0.7, player.bottom))
         
         if keys[pygame.K_SPACE]:
             if self.powered_up:
@@ -676,177 +2188,1188 @@ class Game:
             if self.power_up_time >= self.power_up_duration:
                 self.powered_up = False
                 self.power_up_time = 0
+        if profiler:
+            profiler.mark("input")
         self.spawn_objects()
-        
-        for missile in self.missiles[:]:
-            if missile.update():
-                self.missiles.remove(missile)
-        
-        for missile in self.alien_missiles[:]:
-            if missile.update():
-                self.alien_missiles.remove(missile)
-            elif self.player.rect.colliderect(missile.rect):
-                self.alien_missiles.remove(missile)
-                self.lives -= 1
-                self.explosions.append(Explosion((self.player.rect.centerx, self.player.rect.centery), 30))
-                if self.lives <= 0:
-                    self.game_over = True
-        
-        for heart in self.hearts[:]:
-            if heart.update():
-                self.hearts.remove(heart)
-            elif self.player.rect.colliderect(heart.rect):
-                self.hearts.remove(heart)
-                self.lives += 1
-        
-        for asteroid in self.asteroids[:]:
-            if asteroid.update():
-                self.asteroids.remove(asteroid)
-            elif self.player.rect.colliderect(asteroid.rect):
-                self.asteroids.remove(asteroid)
-                self.explosions.append(Explosion(asteroid.rect.center, asteroid.size))
-                self.lives -= 1
-                if self.lives <= 0:
-                    self.game_over = True
+        if profiler:
+            profiler.mark("spawn")
+        
+        self.missiles.sweep()
+        
+        self.alien_missiles.sweep()
+        hits = self.player_hits(self.alien_missiles)
+        for missile in hits:
+            self.lives -= 1
+            self.explosions.append(spawn(Explosion, (self.player.rect.centerx, self.player.rect.centery), 30))
+            self.emit("hit", self.player.rect.center)
+            if self.lives <= 0:
+                self.game_over = True
+        self.alien_missiles.discard(hits)
+        if profiler:
+            profiler.mark("missiles")
+        
+        self.hearts.sweep()
+        hits = self.player_hits(self.hearts)
+        self.lives += len(hits)
+        self.hearts.discard(hits)
+        if profiler:
+            profiler.mark("pickups")
+        
+        self.asteroids.sweep()
+        hits = self.player_hits(self.asteroids)
+        for asteroid in hits:
+            self.explosions.append(spawn(Explosion, asteroid.rect.center, asteroid.size))
+            self.emit("asteroid", asteroid.rect.center, asteroid.size / ASTEROID_SIZE_MAX)
+            self.lives -= 1
+            if self.lives <= 0:
+                self.game_over = True
+        self.asteroids.discard(hits)
+        if profiler:
+            profiler.mark("asteroids")
+                
+        destroyed = set()
+        spent = set()
+        for asteroid, missile in self.collisions.pairs(self.asteroids, self.missiles):
+            if asteroid in destroyed or missile in spent or not self.touching(asteroid, missile):
+                continue
+            destroyed.add(asteroid)
+            spent.add(missile)
+            self.explosions.append(spawn(Explosion, asteroid.rect.center, asteroid.size))
+            self.emit("asteroid", asteroid.rect.center, asteroid.size / ASTEROID_SIZE_MAX)
+            if isinstance(missile, PowerMissile):
+                self.score += 30
             else:
-                for missile in self.missiles[:]:
-                    if missile.rect.colliderect(asteroid.rect):
-                        self.missiles.remove(missile)
-                        self.asteroids.remove(asteroid)
-                        self.explosions.append(Explosion(asteroid.rect.center, asteroid.size))
-                        if isinstance(missile, PowerMissile):
-                            self.score += 30
-                        else:
-                            self.score += 20
-                        break
-        
-        for star in self.stars[:]:
-            if star.update():
-                self.stars.remove(star)
-            elif self.player.rect.colliderect(star.rect):
-                self.stars.remove(star)
-                self.score += 10
-        
-        for power_star in self.power_stars[:]:
-            if power_star.update():
-                self.power_stars.remove(power_star)
-            elif self.player.rect.colliderect(power_star.rect):
-                self.power_stars.remove(power_star)
-                self.powered_up = True
-                self.power_up_time = 0
-                self.score += 25
+                self.score += 20
+        self.asteroids.discard(destroyed)
+        self.missiles.discard(spent)
+        if profiler:
+            profiler.mark("collisions")
+        
+        self.stars.sweep()
+        hits = self.player_hits(self.stars)
+        self.score += 10 * len(hits)
+        self.stars.discard(hits)
+        
+        self.power_stars.sweep()
+        hits = self.player_hits(self.power_stars)
+        if hits:
+            self.powered_up = True
+            self.power_up_time = 0
+            self.score += 25 * len(hits)
+        self.power_stars.discard(hits)
+        if profiler:
+            profiler.mark("pickups")
         
         if self.alien_boss:
             self.alien_boss.update()
+            boss = self.alien_boss.rect
+            self.emit("alien exhaust", (boss.left + boss.width // 3, boss.top + boss.height * 7 // 8))
+            self.emit("alien exhaust", (boss.left + boss.width * 17 // 24, boss.top + boss.height * 7 // 8))
             
             alien_missiles = self.alien_boss.fire_missile()
             if alien_missiles:
                 self.alien_missiles.extend(alien_missiles)
                 
-            for missile in self.missiles[:]:
-                if missile.rect.colliderect(self.alien_boss.rect):
-                    self.missiles.remove(missile)
-                    if isinstance(missile, PowerMissile):
-                        self.alien_boss.health -= 2
-                    else:
-                        self.alien_boss.health -= 1
-                    self.explosions.append(Explosion((missile.rect.centerx, missile.rect.centery), 20))
-                    
-                    if self.alien_boss.health <= 0:
-                        self.explosions.append(Explosion(self.alien_boss.rect.center, self.alien_boss.size))
-                        self.score += 100
-                        self.hearts.append(Heart(self.alien_boss.rect.centerx, self.alien_boss.rect.centery))
-                        self.alien_boss = None
-                        break
+            boss = self.alien_boss
+            hits = self.hits(boss, self.missiles)
+            spent = set()
+            for missile in hits:
+                spent.add(missile)
+                if isinstance(missile, PowerMissile):
+                    self.alien_boss.health -= 2
+                else:
+                    self.alien_boss.health -= 1
+                self.explosions.append(spawn(Explosion, (missile.rect.centerx, missile.rect.centery), 20))
+                self.emit("hit", missile.rect.midtop)
                 
-        for explosion in self.explosions[:]:
-            if explosion.update():
-                self.explosions.remove(explosion)
+                if self.alien_boss.health <= 0:
+                    self.explosions.append(spawn(Explosion, self.alien_boss.rect.center, self.alien_boss.size))
+                    self.emit("boss", self.alien_boss.rect.center)
+                    self.score += 100
+                    self.bosses_killed += 1
+                    self.hearts.append(Heart(self.alien_boss.rect.centerx, self.alien_boss.rect.centery))
+                    self.alien_boss = None
+                    break
+            self.missiles.discard(spent)
+        if profiler:
+            profiler.mark("boss")
                 
-    def draw(self):
-        screen.fill(BACKGROUND_COLOR)
-        
-        self.star_field.draw(screen)
+        self.explosions.sweep()
+        if profiler:
+            profiler.mark("explosions")
+                
+    def step(self, keys):
+        rewind = self.rewind
+        if rewind is None:
+            self.update(keys)
+        elif keys[pygame.K_BACKSPACE]:
+            rewind.restore(self)
+        else:
+            if len(rewind) == 0:
+                rewind.record(self)
+            self.update(keys)
+            rewind.record(self)
+            
+    def draw_interpolated(self, entity, alpha):
+        rect = entity.rect
+        x, y = rect.topleft
+        prev_x, prev_y = entity.prev_pos
+        rect.topleft = (round(prev_x + (x - prev_x) * alpha), round(prev_y + (y - prev_y) * alpha))
+        drawn = entity.draw(self.screen)
+        rect.topleft = (x, y)
+        return drawn
+        
+    def draw(self, alpha=1.0, snapshot=None):
+        screen = self.screen
+        profiler = self.profiler
+        if profiler:
+            profiler.begin()
+        state = self if snapshot is None else snapshot
+        if alpha < 1.0 and not state.game_over:
+            draw = lambda entity: self.draw_interpolated(entity, alpha)
+        else:
+            draw = lambda entity: entity.draw(screen)
+        previous_rects = self.previous_rects
+        full_redraw = not self.dirty_rects or previous_rects is None or state.generation != self.drawn_generation
+        self.drawn_generation = state.generation
+        if full_redraw:
+            screen.fill(BACKGROUND_COLOR)
+        else:
+            for rect in previous_rects:
+                screen.fill(BACKGROUND_COLOR, rect)
+        if profiler:
+            profiler.mark("draw clear")
+        
+        drawn = state.star_field.draw(screen)
+        if profiler:
+            profiler.mark("draw starfield")
+            
+        if snapshot is None:
+            for group in (self.stars, self.power_stars, self.hearts, self.missiles, self.alien_missiles,
+                          self.asteroids):
+                group.sync()
         
-        for star in self.stars:
-            star.draw(screen)
+        for star in state.stars:
+            drawn.append(draw(star))
             
-        for power_star in self.power_stars:
-            power_star.draw(screen)
+        for power_star in state.power_stars:
+            drawn.append(draw(power_star))
             
-        for heart in self.hearts:
-            heart.draw(screen)
+        for heart in state.hearts:
+            drawn.append(draw(heart))
             
-        for missile in self.missiles:
-            missile.draw(screen)
+        for missile in state.missiles:
+            drawn.append(draw(missile))
             
-        for missile in self.alien_missiles:
-            missile.draw(screen)
+        for missile in state.alien_missiles:
+            drawn.append(draw(missile))
+        if profiler:
+            profiler.mark("draw sprites")
             
-        for asteroid in self.asteroids:
-            asteroid.draw(screen)
+        for asteroid in state.asteroids:
+            drawn.append(draw(asteroid))
+        if profiler:
+            profiler.mark("draw asteroids")
             
-        if self.alien_boss:
-            self.alien_boss.draw(screen)
+        if state.alien_boss:
+            drawn.append(draw(state.alien_boss))
+        if profiler:
+            profiler.mark("draw boss")
             
-        for explosion in self.explosions:
-            explosion.draw(screen)
+        explosions = state.explosions
+        max_explosions = quality.settings.max_explosions
+        if max_explosions is not None and len(explosions) > max_explosions:
+            explosions = explosions[-max_explosions:]
+        for explosion in explosions:
+            drawn.append(explosion.draw(screen))
+        if profiler:
+            profiler.mark("draw explosions")
             
-        self.player.draw(screen)
-        
-        score_text = self.font.render(f"Score: {self.score}", True, (255, 255, 255))
-        lives_text = self.font.render(f"Lives: {self.lives}", True, (255, 255, 255))
-        control_text = self.font.render("← → ↑ ↓: Move   SPACE: Fire", True, (200, 200, 200))
-        
-        screen.blit(score_text, (10, 10))
-        screen.blit(lives_text, (10, 50))
-        screen.blit(control_text, (SCREEN_WIDTH - control_text.get_width() - 10, 10))
-        
-        if self.powered_up:
-            power_up_text = self.font.render("", True, (100, 200, 255))
-            time_left = (self.power_up_duration - self.power_up_time) // FPS
-            timer_text = self.font.render(f"Time: {time_left}s", True, (100, 200, 255))
-            screen.blit(power_up_text, (SCREEN_WIDTH // 2 - power_up_text.get_width() // 2, 10))
-            screen.blit(timer_text, (SCREEN_WIDTH // 2 - timer_text.get_width() // 2, 50))
-        
-        if self.alien_boss and self.alien_boss.rect.y < 80:
-            warning_text = self.font.render("", True, (255, 50, 50))
-            screen.blit(warning_text, (SCREEN_WIDTH // 2 - warning_text.get_width() // 2, 100))
-        
-        if self.game_over:
-            game_over_text = self.font.render("GAME OVER - Press R to Restart", True, (255, 0, 0))
+        if state.particles is not None:
+            drawn.extend(state.particles.draw(screen, alpha))
+        if profiler:
+            profiler.mark("draw particles")
+            
+        drawn.append(draw(state.player))
+        if profiler:
+            profiler.mark("draw sprites")
+        
+        hud = self.hud
+        score_text = hud.render(f"Score: {state.score}", (255, 255, 255))
+        lives_text = hud.render(f"Lives: {state.lives}", (255, 255, 255))
+        controls = "← → ↑ ↓: Move   SPACE: Fire" + ("   BACKSPACE: Rewind" if self.rewind else "")
+        control_text = hud.render_static(controls, (200, 200, 200))
+        
+        drawn.append(screen.blit(score_text, (10, 10)))
+        drawn.append(screen.blit(lives_text, (10, 50)))
+        drawn.append(screen.blit(control_text, (SCREEN_WIDTH - control_text.get_width() - 10, 10)))
+        
+        if state.powered_up:
+            power_up_text = hud.render_static("", (100, 200, 255))
+            time_left = (state.power_up_duration - state.power_up_time) // FPS
+            timer_text = hud.render(f"Time: {time_left}s", (100, 200, 255))
+            drawn.append(screen.blit(power_up_text, (SCREEN_WIDTH // 2 - power_up_text.get_width() // 2, 10)))
+            drawn.append(screen.blit(timer_text, (SCREEN_WIDTH // 2 - timer_text.get_width() // 2, 50)))
+        
+        if state.alien_boss and state.alien_boss.rect.y < 80:
+            warning_text = hud.render_static("", (255, 50, 50))
+            drawn.append(screen.blit(warning_text, (SCREEN_WIDTH // 2 - warning_text.get_width() // 2, 100)))
+        
+        if state.game_over:
+            game_over_text = hud.render_static("GAME OVER - Press R to Restart", (255, 0, 0))
             text_rect = game_over_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2))
-            screen.blit(game_over_text, text_rect)
+            drawn.append(screen.blit(game_over_text, text_rect))
             
-            final_score_text = self.font.render(f"Final Score: {self.score}", True, (255, 200, 0))
+            final_score_text = hud.render(f"Final Score: {state.score}", (255, 200, 0))
             final_score_rect = final_score_text.get_rect(center=(SCREEN_WIDTH//2, SCREEN_HEIGHT//2 + 40))
-            screen.blit(final_score_text, final_score_rect)
+            drawn.append(screen.blit(final_score_text, final_score_rect))
             
-        pygame.display.flip()
+        if profiler:
+            profiler.mark("draw hud")
+            counts = self.entity_counts()
+            drawn.append(profiler.draw(screen, counts))
+            profiler.end_frame(counts)
+            
+        if not self.dirty_rects:
+            return None
+        changed = None if full_redraw else previous_rects + drawn
+        self.previous_rects = drawn
+        if changed is None or len(changed) > DIRTY_RECT_LIMIT:
+            return None
+        return changed
+        
+    def run(self, frames, inputs=(), draw=None):
+        if draw is None:
+            draw = self.screen is not None
+        inputs = iter(inputs)
+        for frame in range(frames):
+            if self.game_over:
+                return frame
+            self.update(next(inputs, NO_KEYS))
+            if draw:
+                self.draw()
+            elif self.profiler:
+                self.profiler.end_frame(self.entity_counts())
+        return frames
         
     def restart(self):
-        self.__init__()
+        self.reset()
+
+def present(rects):
+    if rects is None:
+        pygame.display.flip()
+    else:
+        pygame.display.update(rects)
+
+def run(frames, inputs=(), **options):
+    game = Game(**options)
+    game.run(frames, inputs)
+    return game
+
+class SimulationPipeline:
+    def __init__(self, game):
+        self.game = game
+        self.executor = ThreadPoolExecutor(1)
+        self.snapshot = Snapshot(game)
+        self.spare = Snapshot(game)
+        self.pending = None
+        
+    def simulate(self, inputs):
+        for keys in inputs:
+            self.game.step(keys)
+        return self.spare.capture(self.game)
+        
+    def submit(self, inputs):
+        if inputs:
+            self.pending = self.executor.submit(self.simulate, inputs)
+            
+    def wait(self):
+        if self.pending is not None:
+            self.snapshot, self.spare = self.pending.result(), self.snapshot
+            self.pending = None
+        return self.snapshot
+        
+    def close(self):
+        self.wait()
+        self.executor.shutdown()
+
+entity_templates = {}
+rewind_dtypes = {}
+
+def entity_template(cls):
+    template = entity_templates.get(cls)
+    if template is None:
+        entity = cls(random.Random(0)) if cls in (Star, PowerStar) else cls(0, 0)
+        template = entity_templates[cls] = entity.__dict__
+    return template
+
+def thaw(cls, entity, x, y):
+    if type(entity) is cls:
+        entity.rect.topleft = entity.prev_pos = (x, y)
+        return entity
+    if entity is not None:
+        recycle(entity)
+    template = entity_template(cls)
+    entity = reclaim(cls)
+    entity.__dict__.update(template)
+    entity.rect = pygame.Rect((x, y), template["rect"].size)
+    entity.prev_pos = (x, y)
+    return entity
+
+def thaw_asteroid(asteroid, variant, x, y, speed, rotation, rotation_speed):
+    if type(asteroid) is not Asteroid:
+        if asteroid is not None:
+            recycle(asteroid)
+        asteroid = reclaim(Asteroid)
+    if getattr(asteroid, "variant", None) != variant:
+        asteroid.variant = variant
+        asteroid.image = sprites.asteroid(variant)
+        asteroid.size = asteroid.image.get_width()
+        asteroid.rect = asteroid.image.get_rect()
+    asteroid.rect.topleft = asteroid.prev_pos = (x, y)
+    asteroid.speed = speed
+    asteroid.rotation = rotation
+    asteroid.rotation_speed = rotation_speed
+    return asteroid
+
+def thaw_explosion(explosion, x, y, size, current_frame, frame_counter):
+    if type(explosion) is not Explosion:
+        if explosion is not None:
+            recycle(explosion)
+        explosion = reclaim(Explosion)
+        explosion.reset((x, y), size)
+    else:
+        explosion.position = (x, y)
+        explosion.size = size
+    explosion.current_frame = current_frame
+    explosion.frame_counter = frame_counter
+    return explosion
+
+def thaw_pulsing(cls, entity, x, y, pulse, pulse_dir):
+    entity = thaw(cls, entity, x, y)
+    entity.pulse = pulse
+    entity.pulse_dir = pulse_dir
+    return entity
+
+def rewind_rows(layout, data, offset, count):
+    dtype = rewind_dtypes.get(layout)
+    if dtype is None:
+        names = REWIND_COLUMNS[layout]
+        dtype = rewind_dtypes[layout] = np.dtype([(name, "<" + code) for name, code in zip(names, layout.format[1:])])
+    return np.frombuffer(data, dtype, count, offset)
+
+def template_columns(cls, rows):
+    template = entity_template(cls)
+    width, height = template["rect"].size
+    return {
+        "x": rows["x"], "y": rows["y"], "width": width, "height": height, "prev_x": rows["x"], "prev_y": rows["y"],
+        "vy": -template["speed"] if cls in RISING_ENTITIES else template["speed"],
+        "rotation": 0.0, "spin": 0.0, "pulse": 0.0, "pulse_step": 0.0, "pulse_dir": 1,
+    }
+
+def missile_columns(rows):
+    columns = template_columns(Missile, rows)
+    power = template_columns(PowerMissile, rows)
+    for name in ("width", "height", "vy"):
+        columns[name] = np.where(rows["power"], power[name], columns[name])
+    return columns
+
+def asteroid_columns(rows):
+    variants = rows["variant"]
+    sizes = np.zeros(ASTEROID_VARIANTS, np.int64)
+    for variant in np.unique(variants).tolist():
+        sizes[variant] = sprites.asteroid(variant).get_width()
+    size = sizes[variants]
+    return {
+        "x": rows["x"], "y": rows["y"], "width": size, "height": size, "prev_x": rows["x"], "prev_y": rows["y"],
+        "vy": rows["speed"], "rotation": rows["rotation"], "spin": rows["spin"], "pulse": 0.0, "pulse_step": 0.0,
+        "pulse_dir": 1,
+    }
+
+def pulsing_columns(cls, rows):
+    columns = template_columns(cls, rows)
+    columns["pulse"] = rows["pulse"]
+    columns["pulse_step"] = cls.pulse_step
+    columns["pulse_dir"] = rows["pulse_dir"]
+    return columns
+
+def encode_state(game, star_field=None):
+    for group in (game.missiles, game.asteroids, game.stars, game.power_stars, game.hearts, game.alien_missiles):
+        group.sync()
+    player = game.player
+    boss = game.alien_boss
+    parts = [
+        REWIND_GAME.pack(*[getattr(game, name) for name in REWIND_GAME_FIELDS]),
+        REWIND_PLAYER.pack(player.rect.x, player.rect.y, player.cooldown),
+        REWIND_COUNTS.pack(len(game.missiles), len(game.asteroids), len(game.explosions), len(game.stars),
+                           len(game.power_stars), len(game.hearts), len(game.alien_missiles), boss is not None),
+    ]
+    parts.extend(REWIND_MISSILE.pack(type(missile) is PowerMissile, missile.rect.x, missile.rect.y)
+                 for missile in game.missiles)
+    parts.extend(REWIND_ASTEROID.pack(asteroid.variant, asteroid.rect.x, asteroid.rect.y, asteroid.speed,
+                                      asteroid.rotation, asteroid.rotation_speed)
+                 for asteroid in game.asteroids)
+    parts.extend(REWIND_EXPLOSION.pack(*explosion.position, explosion.size, explosion.current_frame,
+                                       explosion.frame_counter)
+                 for explosion in game.explosions)
+    parts.extend(REWIND_POSITION.pack(*star.rect.topleft) for star in game.stars)
+    for group in (game.power_stars, game.hearts):
+        parts.extend(REWIND_PULSE.pack(*entity.rect.topleft, entity.pulse, entity.pulse_dir) for entity in group)
+    parts.extend(REWIND_POSITION.pack(*missile.rect.topleft) for missile in game.alien_missiles)
+    if boss is not None:
+        parts.append(REWIND_BOSS.pack(*boss.rect.topleft, boss.health, boss.max_health, boss.direction,
+                                      boss.shoot_cooldown, boss.shoot_delay, boss.energy_pulse))
+    parts.append(game.star_field.pack_state() if star_field is None else star_field)
+    return b"".join(parts)
+
+def decode_state(game, data, star_field=True):
+    data = memoryview(data)
+    for name, value in zip(REWIND_GAME_FIELDS, REWIND_GAME.unpack_from(data)):
+        setattr(game, name, value)
+    offset = REWIND_GAME.size
+    x, y, game.player.cooldown = REWIND_PLAYER.unpack_from(data, offset)
+    game.player.rect.topleft = game.player.prev_pos = (x, y)
+    offset += REWIND_PLAYER.size
+    *counts, has_boss = REWIND_COUNTS.unpack_from(data, offset)
+    offset += REWIND_COUNTS.size
+    
+    def reused(group, layout, count):
+        nonlocal offset
+        start = offset
+        offset += layout.size * count
+        entities = list(group)
+        for entity in entities[count:]:
+            recycle(entity)
+        entities.extend([None] * (count - len(entities)))
+        return start, zip(entities, layout.iter_unpack(data[start:offset]))
+        
+    def restore(group, layout, count, cls):
+        start, pairs = reused(group, layout, count)
+        entities = [thaw(cls, entity, x, y) for entity, (x, y) in pairs]
+        group.replace(entities, lambda: template_columns(cls, rewind_rows(layout, data, start, count)))
+        
+    def restore_pulsing(group, count, cls):
+        start, pairs = reused(group, REWIND_PULSE, count)
+        entities = [thaw_pulsing(cls, entity, *row) for entity, row in pairs]
+        group.replace(entities, lambda: pulsing_columns(cls, rewind_rows(REWIND_PULSE, data, start, count)))
+        
+    def restore_missiles(count):
+        start, pairs = reused(game.missiles, REWIND_MISSILE, count)
+        entities = [thaw(PowerMissile if power else Missile, missile, x, y) for missile, (power, x, y) in pairs]
+        game.missiles.replace(entities, lambda: missile_columns(rewind_rows(REWIND_MISSILE, data, start, count)))
+        
+    def restore_asteroids(count):
+        nonlocal offset
+        start = offset
+        offset += REWIND_ASTEROID.size * count
+        variants = {}
+        for asteroid in game.asteroids:
+            variants.setdefault(asteroid.variant, []).append(asteroid)
+        entities = []
+        for row in REWIND_ASTEROID.iter_unpack(data[start:offset]):
+            matches = variants.get(row[0])
+            entities.append(thaw_asteroid(matches.pop() if matches else None, *row))
+        for matches in variants.values():
+            for asteroid in matches:
+                recycle(asteroid)
+        game.asteroids.replace(entities, lambda: asteroid_columns(rewind_rows(REWIND_ASTEROID, data, start, count)))
+        
+    def restore_explosions(count):
+        start, pairs = reused(game.explosions, REWIND_EXPLOSION, count)
+        entities = [thaw_explosion(explosion, *row) for explosion, row in pairs]
+        game.explosions.replace(entities)
+        
+    missiles, asteroids, explosions, stars, power_stars, hearts, alien_missiles = counts
+    restore_missiles(missiles)
+    restore_asteroids(asteroids)
+    restore_explosions(explosions)
+    restore(game.stars, REWIND_POSITION, stars, Star)
+    restore_pulsing(game.power_stars, power_stars, PowerStar)
+    restore_pulsing(game.hearts, hearts, Heart)
+    restore(game.alien_missiles, REWIND_POSITION, alien_missiles, AlienMissile)
+        
+    if has_boss:
+        x, y, health, max_health, direction, shoot_cooldown, shoot_delay, energy_pulse = \
+            REWIND_BOSS.unpack_from(data, offset)
+        offset += REWIND_BOSS.size
+        boss = game.alien_boss or AlienBoss(max_health)
+        boss.rect.topleft = boss.prev_pos = (x, y)
+        boss.health = health
+        boss.max_health = max_health
+        boss.direction = direction
+        boss.shoot_cooldown = shoot_cooldown
+        boss.shoot_delay = shoot_delay
+        boss.energy_pulse = energy_pulse
+        game.alien_boss = boss
+    else:
+        game.alien_boss = None
+    if star_field:
+        game.star_field.unpack_state(data, offset)
+    game.rng.begin_frame(game.frame)
+    game.generation += 1
+    if game.particles is not None:
+        game.particles.clear()
+    return offset
+
+class RewindBuffer:
+    def __init__(self, seconds=REWIND_SECONDS, frame_bytes=REWIND_FRAME_BYTES):
+        self.seconds = seconds
+        self.limit = seconds * FPS
+        self.memory = bytearray(self.limit * frame_bytes)
+        self.entries = deque()
+        self.cursor = 0
+        self.used = 0
+        self.short = False
+        self.star_field = None
+        self.star_state = None
+        
+    def __len__(self):
+        return len(self.entries)
+        
+    def evict(self):
+        if len(self.entries) < self.limit:
+            self.short = True
+        self.used -= self.entries.popleft()[1]
+        
+    def push(self, data):
+        size = len(data)
+        start = self.cursor
+        if start + size > len(self.memory):
+            while self.entries and self.entries[0][0] >= start:
+                self.evict()
+            start = 0
+        end = start + size
+        while self.entries and (len(self.entries) >= self.limit or start <= self.entries[0][0] < end):
+            self.evict()
+        if end > len(self.memory):
+            self.short = True
+            return
+        self.memory[start:end] = data
+        self.entries.append((start, size))
+        self.cursor = end
+        self.used += size
+        
+    def star_undo(self, star_field):
+        previous = self.star_state
+        if not self.entries or previous is None:
+            return REWIND_STAR_UNDO.pack(REWIND_UNDO_NONE, 0, 0)
+        if self.star_field is star_field and star_field.updates - REWIND_STAR_LIST.unpack_from(previous)[2] in (0, 1):
+            return star_field.pack_undo(previous)
+        return REWIND_STAR_UNDO.pack(REWIND_UNDO_KEYFRAME, 0, 0) + previous
+        
+    def record(self, game):
+        star_field = game.star_field
+        undo = self.star_undo(star_field)
+        self.push(b"".join((REWIND_UNDO_SIZE.pack(len(undo)), undo, encode_state(game, b""))))
+        self.star_field = star_field
+        self.star_state = star_field.pack_state()
+        
+    def restore(self, game):
+        if len(self.entries) < 2:
+            return False
+        self.cursor, size = self.entries.pop()
+        self.used -= size
+        memory = memoryview(self.memory)
+        start = self.cursor + REWIND_UNDO_SIZE.size
+        undo = memory[start:start + REWIND_UNDO_SIZE.unpack_from(memory, self.cursor)[0]]
+        start, size = self.entries[-1]
+        skip = REWIND_UNDO_SIZE.size + REWIND_UNDO_SIZE.unpack_from(memory, start)[0]
+        decode_state(game, memory[start + skip:start + size], False)
+        kind = undo[0]
+        if kind == REWIND_UNDO_DELTA:
+            game.star_field.unpack_undo(undo, 0)
+        elif kind == REWIND_UNDO_KEYFRAME:
+            game.star_field.unpack_state(undo, REWIND_STAR_UNDO.size)
+        self.star_field = game.star_field
+        self.star_state = game.star_field.pack_state()
+        return True
+        
+    def seconds_held(self):
+        return max(len(self.entries) - 1, 0) / FPS
+        
+    def bytes_per_second(self):
+        return self.used / max(len(self.entries), 1) * FPS
+
+def encode_delta(frame, previous, delta):
+    count = len(frame) // CAPTURE_SEGMENT_BYTES
+    if np is None:
+        changed = (int.from_bytes(frame, "little") ^ int.from_bytes(previous, "little")).to_bytes(len(frame), "little")
+        return b"\xff" * ((count + 7) // 8) + changed
+    np.bitwise_xor(np.frombuffer(frame, np.uint8), np.frombuffer(previous, np.uint8), out=delta)
+    segments = delta.reshape(count, CAPTURE_SEGMENT_BYTES)
+    changed = delta.view(np.uint64).reshape(count, -1).any(axis=1)
+    return np.packbits(changed).tobytes() + segments[changed].tobytes()
+
+def decode_delta(pixels, data):
+    count = len(pixels) // CAPTURE_SEGMENT_BYTES
+    offset = (count + 7) // 8
+    if np is None:
+        delta = bytearray(len(pixels))
+        for segment in range(count):
+            if data[segment >> 3] & (0x80 >> (segment & 7)):
+                start = segment * CAPTURE_SEGMENT_BYTES
+                delta[start:start + CAPTURE_SEGMENT_BYTES] = data[offset:offset + CAPTURE_SEGMENT_BYTES]
+                offset += CAPTURE_SEGMENT_BYTES
+        pixels[:] = (int.from_bytes(pixels, "little") ^ int.from_bytes(delta, "little")).to_bytes(len(pixels), "little")
+        return
+    changed = np.unpackbits(np.frombuffer(data, np.uint8, offset), count=count).view(bool)
+    segments = np.frombuffer(pixels, np.uint8).reshape(count, CAPTURE_SEGMENT_BYTES)
+    segments[changed] ^= np.frombuffer(data, np.uint8, offset=offset).reshape(-1, CAPTURE_SEGMENT_BYTES)
+
+class FrameCapture:
+    def __init__(self, path, surface, buffers=CAPTURE_BUFFERS, level=CAPTURE_COMPRESSION):
+        self.size = surface.get_size()
+        self.frame_bytes = surface.get_pitch() * surface.get_height()
+        padded = -(-self.frame_bytes // CAPTURE_SEGMENT_BYTES) * CAPTURE_SEGMENT_BYTES
+        self.level = level
+        self.file = open(path, "wb")
+        self.file.write(CAPTURE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, *self.size, surface.get_pitch(),
+                                            surface.get_bytesize(), *surface.get_masks()))
+        self.index = []
+        self.free = queue.Queue()
+        for _ in range(buffers):
+            self.free.put(bytearray(padded))
+        self.pending = queue.Queue()
+        self.previous = bytearray(padded)
+        self.delta = np.zeros(padded, np.uint8) if np is not None else None
+        self.frames = 0
+        self.dropped = 0
+        self.start = time.perf_counter()
+        self.writer = threading.Thread(target=self.write_frames, daemon=True)
+        self.writer.start()
+        
+    def capture(self, surface):
+        self.frames += 1
+        try:
+            buffer = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return False
+        memoryview(buffer)[:self.frame_bytes] = memoryview(surface.get_buffer())
+        self.pending.put((buffer, self.frames, time.perf_counter() - self.start))
+        return True
+        
+    def write_frames(self):
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            buffer, frame, timestamp = item
+            keyframe = len(self.index) % CAPTURE_KEYFRAME_INTERVAL == 0
+            data = zlib.compress(buffer if keyframe else encode_delta(buffer, self.previous, self.delta), self.level)
+            self.index.append((self.file.tell(), len(data), frame, timestamp, keyframe))
+            self.file.write(data)
+            self.previous, buffer = buffer, self.previous
+            self.free.put(buffer)
+            
+    def close(self):
+        self.pending.put(None)
+        self.writer.join()
+        index_offset = self.file.tell()
+        for entry in self.index:
+            self.file.write(CAPTURE_INDEX_ENTRY.pack(*entry))
+        self.file.write(CAPTURE_TRAILER.pack(index_offset, len(self.index)))
+        self.file.close()
+
+class CaptureReader:
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        header = self.file.read(CAPTURE_HEADER.size)
+        magic, version, width, height, pitch, bytesize, *masks = CAPTURE_HEADER.unpack(header)
+        if magic != CAPTURE_MAGIC or version != CAPTURE_VERSION:
+            raise ValueError(f"{path}: not a version {CAPTURE_VERSION} Space Explorer capture")
+        self.size = (width, height)
+        self.pitch = pitch
+        self.bytesize = bytesize
+        self.masks = masks
+        self.file.seek(-CAPTURE_TRAILER.size, os.SEEK_END)
+        index_offset, count = CAPTURE_TRAILER.unpack(self.file.read(CAPTURE_TRAILER.size))
+        self.file.seek(index_offset)
+        self.index = list(CAPTURE_INDEX_ENTRY.iter_unpack(self.file.read(count * CAPTURE_INDEX_ENTRY.size)))
+        self.times = [entry[3] for entry in self.index]
+        self.position = None
+        self.pixels = None
+        
+    def __len__(self):
+        return len(self.index)
+        
+    def read(self, position):
+        start = position
+        while not self.index[start][4]:
+            start -= 1
+        if self.position is not None and start <= self.position <= position:
+            start = self.position + 1
+        for current in range(start, position + 1):
+            offset, size, frame, timestamp, keyframe = self.index[current]
+            self.file.seek(offset)
+            data = zlib.decompress(self.file.read(size))
+            if keyframe:
+                self.pixels = bytearray(data)
+            else:
+                decode_delta(self.pixels, data)
+        self.position = position
+        return memoryview(self.pixels)[:self.pitch * self.size[1]]
+        
+    def surface(self, position, surface=None):
+        if surface is None:
+            surface = pygame.Surface(self.size, 0, self.bytesize * 8, self.masks)
+        pixels = self.read(position)
+        view = memoryview(surface.get_buffer())
+        pitch = surface.get_pitch()
+        if pitch == self.pitch:
+            view[:] = pixels
+        else:
+            row_bytes = self.size[0] * self.bytesize
+            for row in range(self.size[1]):
+                view[row * pitch:row * pitch + row_bytes] = pixels[row * self.pitch:row * self.pitch + row_bytes]
+        view.release()
+        return surface
+        
+    def close(self):
+        self.file.close()
+
+def play_capture(path):
+    reader = CaptureReader(path)
+    pygame.display.init()
+    screen = pygame.display.set_mode(reader.size)
+    pygame.display.set_caption(f"Space Explorer - {os.path.basename(path)}")
+    frame = pygame.Surface(reader.size, 0, reader.bytesize * 8, reader.masks)
+    clock = pygame.time.Clock()
+    position = 0
+    offset = time.perf_counter()
+    running = True
+    while running and position < len(reader):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                running = False
+            if event.type == pygame.KEYDOWN and event.key in (pygame.K_LEFT, pygame.K_RIGHT):
+                seconds = CAPTURE_SEEK_SECONDS if event.key == pygame.K_RIGHT else -CAPTURE_SEEK_SECONDS
+                target = reader.times[min(position, len(reader) - 1)] + seconds
+                position = min(bisect.bisect_left(reader.times, target), len(reader) - 1)
+                offset = time.perf_counter() - reader.times[position]
+        if time.perf_counter() - offset >= reader.times[position]:
+            screen.blit(reader.surface(position, frame), (0, 0))
+            pygame.display.flip()
+            position += 1
+        clock.tick(MAX_RENDER_FPS)
+    reader.close()
+    pygame.quit()
+
+class InputRecorder:
+    def __init__(self, seed):
+        self.seed = seed
+        self.masks = bytearray()
+        
+    def record(self, keys):
+        mask = key_mask(keys)
+        self.masks.append(mask)
+        return MASK_KEYS[mask]
+        
+    def save(self, path, game):
+        flags = RECORDING_PIXEL_COLLISION if game.pixel_collision else 0
+        rewind = game.rewind.seconds if game.rewind else 0
+        save_recording(path, self.seed, self.masks, game.score, game.lives, flags, rewind)
+
+def save_recording(path, seed, masks, score, lives, flags=0, rewind=0):
+    header = RECORDING_HEADER.pack(RECORDING_MAGIC, RECORDING_VERSION, flags, seed, len(masks), score, lives,
+                                   rewind)
+    with open(path, "wb") as f:
+        f.write(header)
+        f.write(zlib.compress(bytes(masks), 9))
+
+def load_recording(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, version, flags, seed, frames, score, lives, rewind = RECORDING_HEADER.unpack_from(data)
+    if magic != RECORDING_MAGIC or version != RECORDING_VERSION:
+        raise ValueError(f"{path}: not a version {RECORDING_VERSION} Space Explorer recording")
+    masks = zlib.decompress(data[RECORDING_HEADER.size:])
+    if len(masks) != frames:
+        raise ValueError(f"{path}: expected {frames} frames, found {len(masks)}")
+    return seed, masks, score, lives, flags, rewind
+
+def replay(path, collision="brute"):
+    seed, masks, score, lives, flags, rewind = load_recording(path)
+    game = Game(collision=collision, seed=seed, pixel_collision=bool(flags & RECORDING_PIXEL_COLLISION))
+    if rewind:
+        game.rewind = RewindBuffer(rewind)
+    for mask in masks:
+        game.step(MASK_KEYS[mask])
+    return game, game.score == score and game.lives == lives
+
+class IdlePolicy:
+    def __init__(self, seed):
+        pass
+        
+    def __call__(self, game):
+        return NO_KEYS
+
+class SweepPolicy:
+    def __init__(self, seed):
+        self.left = KeyState((pygame.K_LEFT, pygame.K_SPACE))
+        self.right = KeyState((pygame.K_RIGHT, pygame.K_SPACE))
+        
+    def __call__(self, game):
+        return self.left if (game.frame // 90) % 2 else self.right
+
+class RandomPolicy:
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.keys = NO_KEYS
+        
+    def __call__(self, game):
+        if game.frame % POLICY_HOLD_FRAMES == 0:
+            self.keys = MASK_KEYS[self.rng.randrange(ENV_ACTIONS)]
+        return self.keys
+
+POLICIES = {
+    "idle": IdlePolicy,
+    "random": RandomPolicy,
+    "sweep": SweepPolicy,
+}
+
+def play_game(task):
+    seed, policy, params, max_frames, collision = task
+    game = Game(collision=collision, seed=seed)
+    for name, value in params:
+        setattr(game, name, value)
+    policy = POLICIES[policy](seed)
+    while not game.game_over and game.frame < max_frames:
+        game.update(policy(game))
+    return seed, game.score, game.frame, game.bosses_killed, game.lives
+
+def run_batch(games, policy="random", params=(), max_frames=BATCH_GAME_FRAMES, processes=None, first_seed=0,
+              collision="brute"):
+    tasks = [(seed, policy, tuple(params), max_frames, collision) for seed in range(first_seed, first_seed + games)]
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        results = list(map(play_game, tasks))
+    else:
+        chunksize = max(1, len(tasks) // (processes * 8))
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(play_game, tasks, chunksize)
+        finally:
+            pool.close()
+            pool.join()
+    return {name: list(column) for name, column in zip(BATCH_COLUMNS, zip(*results))}
+
+def save_columns(path, columns):
+    if path.endswith(".npz") and np is not None:
+        np.savez_compressed(path, **{name: np.array(column) for name, column in columns.items()})
+        return
+    with open(path, "w") as f:
+        json.dump(columns, f)
+
+def summarize(columns):
+    summary = {}
+    for name in BATCH_COLUMNS[1:]:
+        values = sorted(columns[name])
+        summary[name] = {
+            "mean": sum(values) / len(values),
+            "min": values[0],
+            "median": values[len(values) // 2],
+            "max": values[-1],
+        }
+    return summary
+
+def parse_parameter(text):
+    name, _, value = text.partition("=")
+    if name not in BATCH_PARAMETERS:
+        raise argparse.ArgumentTypeError(f"unknown parameter {name!r}, choose from: {', '.join(BATCH_PARAMETERS)}")
+    try:
+        value = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{name} needs a number")
+    return name, int(value) if value.is_integer() else value
+
+def parse_seed(text):
+    try:
+        seed = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid seed {text!r}")
+    if not 0 <= seed < 2 ** 64:
+        raise argparse.ArgumentTypeError(f"seed must be between 0 and {2 ** 64 - 1}")
+    return seed
+
+class Environment:
+    def __init__(self, observation="state", size=None, stack=1, max_frames=None, collision="brute",
+                 pixel_collision=False):
+        if np is None:
+            raise RuntimeError("Environment needs NumPy")
+        if observation not in ("state", "pixels"):
+            raise ValueError(f"unknown observation {observation!r}, choose from: state, pixels")
+        self.observation = observation
+        self.stack = stack
+        self.max_frames = max_frames
+        self.options = {"collision": collision, "pixel_collision": pixel_collision}
+        self.screen = None
+        self.view = None
+        if observation == "pixels":
+            self.screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+            self.target = pygame.Surface(size or (SCREEN_WIDTH, SCREEN_HEIGHT))
+            self.view = pygame.surfarray.pixels3d(self.target).transpose(1, 0, 2)
+            if self.target.get_size() == self.screen.get_size():
+                self.pixels = pygame.surfarray.pixels2d(self.target)
+            else:
+                self.pixels = None
+            shape, dtype = self.view.shape, np.uint8
+        else:
+            self.state = np.zeros(ENV_STATE_SIZE, np.float32)
+            shape, dtype = self.state.shape, np.float32
+        self.frames = np.zeros((2 * stack,) + shape, dtype) if stack > 1 else None
+        self.slot = 0
+        self.game = None
+        
+    def reset(self, seed=None):
+        self.game = Game(self.screen, seed=seed, **self.options)
+        self.score = 0
+        observation = self.observe()
+        if self.frames is not None:
+            self.frames[:] = observation
+            self.slot = 0
+            return self.frames[1:1 + self.stack]
+        return observation
+        
+    def step(self, action):
+        if not 0 <= action < ENV_ACTIONS:
+            raise ValueError(f"action must be between 0 and {ENV_ACTIONS - 1}, got {action!r}")
+        game = self.game
+        game.update(MASK_KEYS[action])
+        reward = game.score - self.score
+        self.score = game.score
+        done = game.game_over or (self.max_frames is not None and game.frame >= self.max_frames)
+        info = {"frame": game.frame, "lives": game.lives, "bosses_killed": game.bosses_killed}
+        return self.push(self.observe()), reward, done, info
+        
+    def push(self, observation):
+        frames = self.frames
+        if frames is None:
+            return observation
+        slot = self.slot = (self.slot + 1) % self.stack
+        frames[slot] = observation
+        frames[slot + self.stack] = observation
+        return frames[slot + 1:slot + 1 + self.stack]
+        
+    def observe(self):
+        if self.view is not None:
+            self.game.draw()
+            if self.pixels is None:
+                pygame.transform.scale(self.screen, self.target.get_size(), self.target)
+            else:
+                np.copyto(self.pixels, pygame.surfarray.pixels2d(self.screen))
+            return self.view
+        game = self.game
+        state = self.state
+        state[:] = 0
+        player = game.player
+        state[0], state[1] = player.rect.center
+        state[2] = game.lives
+        state[3] = game.power_up_duration - game.power_up_time if game.powered_up else 0
+        boss = game.alien_boss
+        if boss:
+            state[4] = 1
+            state[5], state[6] = boss.rect.center
+            state[7] = boss.health
+        offset = ENV_STATE_HEADER
+        for name in ENV_STATE_GROUPS:
+            for index, entity in enumerate(itertools.islice(getattr(game, name), ENV_STATE_SLOTS)):
+                rect = entity.rect
+                row = offset + index * 3
+                state[row], state[row + 1], state[row + 2] = rect.centerx, rect.centery, rect.width
+            offset += ENV_STATE_SLOTS * 3
+        return state
 
 def main():
-    game = Game()
+    parser = argparse.ArgumentParser(description="Space Explorer")
+    parser.add_argument("--headless", action="store_true",
+                        help="simulate without a window as fast as possible")
+    parser.add_argument("--frames", type=int,
+                        help="number of frames to simulate in headless mode (default "
+                             f"{FPS * 60}), or to render before quitting otherwise")
+    parser.add_argument("--collision", choices=sorted(COLLISION_BACKENDS), default="brute",
+                        help="collision detection backend, also used by --batch games")
+    parser.add_argument("--pixel-collision", action="store_true",
+                        help="count hits only where sprite pixels overlap, not just their bounding boxes")
+    parser.add_argument("--dirty-rects", action="store_true",
+                        help="redraw and update only the screen regions that changed")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="simulate the next frame on a second thread while the current one is drawn")
+    parser.add_argument("--quality", choices=["auto"] + [str(level) for level in range(len(QUALITY_LEVELS))],
+                        default="auto",
+                        help="effect quality level, 0 for full detail; auto steps down while frames take over "
+                             f"{QUALITY_LOWER * 100:.0f}%% of the {QUALITY_BUDGET * 1000:.1f} ms budget and back up "
+                             "once there is headroom")
+    parser.add_argument("--max-fps", type=int, default=MAX_RENDER_FPS,
+                        help="render frame rate cap, 0 for uncapped (the simulation always runs at "
+                             f"{SIMULATION_RATE} steps per second)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="profile every frame from the start and export the last "
+                             f"{PROFILE_HISTORY} frames to FILE (.json or .csv) on exit; F3 toggles the overlay")
+    parser.add_argument("--sprite-atlas", metavar="FILE",
+                        help="load generated sprites from FILE, regenerating and saving it when missing or stale")
+    parser.add_argument("--seed", type=parse_seed,
+                        help="seed for all gameplay randomness, 0 to 2**64 - 1 (random by default)")
+    parser.add_argument("--record", metavar="FILE",
+                        help="record the session's key presses to FILE")
+    parser.add_argument("--rewind", type=int, default=REWIND_SECONDS, metavar="SECONDS",
+                        help=f"seconds of gameplay kept for rewinding with BACKSPACE (default {REWIND_SECONDS}, "
+                             "0 disables)")
+    parser.add_argument("--capture", metavar="FILE",
+                        help="capture every rendered frame to FILE from a background thread")
+    parser.add_argument("--play", metavar="FILE",
+                        help="play back a captured session (LEFT/RIGHT seek, ESC quits)")
+    parser.add_argument("--batch", type=int, metavar="GAMES",
+                        help="play GAMES seeded headless games across a process pool and summarize the results; "
+                             "--frames caps each game (default "
+                             f"{BATCH_GAME_FRAMES}) and --seed is the first seed")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="random",
+                        help="batch input policy")
+    parser.add_argument("--processes", type=int,
+                        help="batch worker processes (default: one per CPU)")
+    parser.add_argument("--set", dest="params", metavar="NAME=VALUE", type=parse_parameter, action="append",
+                        default=[], help="batch game parameter override, from: " + ", ".join(BATCH_PARAMETERS))
+    parser.add_argument("--results", metavar="FILE",
+                        help="write batch results as columns to FILE (.npz with NumPy, JSON otherwise)")
+    parser.add_argument("--replay", metavar="FILE", nargs="+",
+                        help="re-run recorded sessions headlessly and check their final score and lives")
+    args = parser.parse_args()
+    
+    if args.play:
+        play_capture(args.play)
+        return
+        
+    if not (args.sprite_atlas and sprites.load(args.sprite_atlas)):
+        warm_sprites()
+        if args.sprite_atlas:
+            sprites.save(args.sprite_atlas)
+            
+    if args.batch:
+        start = time.perf_counter()
+        columns = run_batch(args.batch, args.policy, args.params,
+                            BATCH_GAME_FRAMES if args.frames is None else args.frames,
+                            args.processes, args.seed or 0, args.collision)
+        elapsed = time.perf_counter() - start
+        if args.results:
+            save_columns(args.results, columns)
+        print(json.dumps(summarize(columns), indent=2))
+        frames = sum(columns["frames"])
+        print(f"{args.batch} games, {frames} frames in {elapsed:.2f}s  "
+              f"({args.batch / elapsed:.1f} games/s, {frames / elapsed:.0f} frames/s)")
+        return
+        
+    if args.replay:
+        failed = 0
+        for path in args.replay:
+            start = time.perf_counter()
+            game, ok = replay(path, args.collision)
+            elapsed = time.perf_counter() - start
+            failed += not ok
+            print(f"{path}: {'ok' if ok else 'MISMATCH'}  frames: {game.frame}  score: {game.score}  "
+                  f"lives: {game.lives}  time: {elapsed:.2f}s")
+        sys.exit(1 if failed else 0)
+        
+    if args.headless:
+        if args.record:
+            parser.error("--record needs an interactive session")
+        if args.pipeline:
+            parser.error("--pipeline needs an interactive session")
+        if args.capture:
+            parser.error("--capture needs an interactive session")
+        start = time.perf_counter()
+        game = Game(collision=args.collision, seed=args.seed, pixel_collision=args.pixel_collision)
+        if args.profile:
+            game.profiler = FrameProfiler()
+        game.run(FPS * 60 if args.frames is None else args.frames)
+        elapsed = time.perf_counter() - start
+        print(f"seed: {game.seed}  frames: {game.frame}  score: {game.score}  lives: {game.lives}  "
+              f"time: {elapsed:.2f}s  ({game.frame / max(elapsed, 1e-9):.0f} frames/s)")
+        if args.profile:
+            game.profiler.export(args.profile)
+        return
+        
+    if args.pipeline and args.profile:
+        parser.error("--profile cannot time a pipelined session")
+        
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption("Space Explorer")
+    clock = pygame.time.Clock()
+    game = Game(screen, args.collision, args.dirty_rects, args.seed, args.pixel_collision)
+    recorder = InputRecorder(game.seed) if args.record else None
+    if args.profile:
+        game.profiler = FrameProfiler()
+    if args.rewind > 0:
+        game.rewind = RewindBuffer(args.rewind)
+    pipeline = SimulationPipeline(game) if args.pipeline else None
+    capture = FrameCapture(args.capture, screen) if args.capture else None
+    if args.quality == "auto":
+        quality.adaptive = True
+    else:
+        quality.set_level(int(args.quality))
+    gc.freeze()
+    
+    step = 1 / SIMULATION_RATE
+    accumulator = 0.0
+    previous = time.perf_counter()
+    rendered = 0
     
     running = True
     while running:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_r and game.game_over:
-                    game.restart()
-                if event.key == pygame.K_ESCAPE:
-                    running = False
-        
-        game.update()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                running = False
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3 and pipeline is None:
+                game.profiler = FrameProfiler() if game.profiler is None else None
+                game.previous_rects = None
         
-        game.draw()
+        now = time.perf_counter()
+        accumulator += now - previous
+        previous = now
         
-        clock.tick(FPS)
+        keys = pygame.key.get_pressed()
+        inputs = []
+        while accumulator >= step and len(inputs) < MAX_CATCH_UP_STEPS:
+            inputs.append(keys if recorder is None else recorder.record(keys))
+            accumulator -= step
+        if accumulator >= step:
+            accumulator %= step
+        
+        if pipeline is None:
+            for keys in inputs:
+                game.step(keys)
+            present(game.draw(accumulator / step))
+        else:
+            pipeline.submit(inputs)
+            present(game.draw(accumulator / step, pipeline.snapshot))
+            pipeline.wait()
+        if capture is not None:
+            capture.capture(screen)
+        quality.record(time.perf_counter() - now)
+        rendered += 1
+        if rendered == args.frames:
+            print(f"rendered {rendered} frames", flush=True)
+            running = False
+        
+        clock.tick(args.max_fps)
     
+    if pipeline is not None:
+        pipeline.close()
+    if capture is not None:
+        capture.close()
+        print(f"captured {capture.frames - capture.dropped} of {capture.frames} frames to {args.capture}")
+    if recorder is not None:
+        recorder.save(args.record, game)
+    if game.rewind is not None and game.rewind.short:
+        print(f"rewind kept only {game.rewind.seconds_held():.1f} s of the requested {game.rewind.seconds} s "
+              f"({game.rewind.bytes_per_second() / 1024:.1f} KiB/s of snapshots)")
+    if args.profile and game.profiler is not None:
+        game.profiler.export(args.profile)
     pygame.quit()
     sys.exit()
 